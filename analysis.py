@@ -0,0 +1,186 @@
+"""Evaluating the impact of COVID-19 on Canadians’ spending habits: analysis module
+
+This module is responsible for relating the loaded series to each other, by computing
+correlations and lagged cross-correlations between COVID cases, the unemployment rate
+and every CPI and CSI category.
+
+Copyright and Usage Information
+===============================
+This file is Copyright (c) 2021 Rafael Gacesa.
+"""
+from datetime import date
+import numpy as np
+import pandas as pd
+from memory import SpillCache
+
+# Correlation results computed so far, keyed by dataset version, date range and parameters
+_CACHE = SpillCache('correlations')
+
+
+def series_matrix(months: list) -> tuple[list[str], np.ndarray]:
+    """Returns the names of every series in months and a 2D array with one row per month
+    and one column per series.
+
+    months may be a list of Month objects, or the rows of a DataFrame made from them.
+    CPI and CSI categories are named 'cpi: <category>' and 'csi: <category>'. Series
+    with missing values, or which never change over the range, are left out since their
+    correlation is undefined.
+    """
+    cpi_names = sorted({name for month in months for name in month.cpi})
+    csi_names = sorted({name for month in months for name in month.csi})
+
+    names = ['covid_cases', 'unemployment_rate'] + ['cpi: ' + name for name in cpi_names] \
+        + ['csi: ' + name for name in csi_names]
+    matrix = np.array([[month.covid_cases, month.unemployment_rate]
+                       + [month.cpi.get(name, np.nan) for name in cpi_names]
+                       + [month.csi.get(name, np.nan) for name in csi_names]
+                       for month in months], dtype=float)
+
+    keep = ~np.isnan(matrix).any(axis=0) & (np.ptp(matrix, axis=0) > 0)
+    return [names[i] for i in range(len(names)) if keep[i]], matrix[:, keep]
+
+
+def standardize(matrix: np.ndarray) -> np.ndarray:
+    """Returns matrix with every column shifted to a mean of 0 and scaled to a standard
+    deviation of 1.
+    """
+    return (matrix - matrix.mean(axis=0)) / matrix.std(axis=0, ddof=1)
+
+
+def rank_columns(matrix: np.ndarray) -> np.ndarray:
+    """Returns matrix with every value replaced by its rank within its column, with ties
+    given their average rank.
+    """
+    return pd.DataFrame(matrix).rank(axis=0).to_numpy()
+
+
+def correlation_matrix(matrix: np.ndarray, method: str = 'pearson') -> np.ndarray:
+    """Returns the square matrix of correlations between every pair of columns of matrix.
+
+    All pairs are computed at once as a single matrix product of the standardized columns.
+
+    Preconditions:
+        - method in {'pearson', 'spearman'}
+        - matrix.shape[0] >= 2
+
+    >>> corr = correlation_matrix(np.array([[1.0, 2.0], [2.0, 4.0], [3.0, 5.0]]))
+    >>> bool(np.allclose(np.diag(corr), 1.0))
+    True
+    """
+    if method == 'spearman':
+        matrix = rank_columns(matrix)
+
+    z = standardize(matrix)
+    return z.T @ z / (matrix.shape[0] - 1)
+
+
+def lagged_correlations(matrix: np.ndarray, max_lag: int,
+                        method: str = 'pearson') -> np.ndarray:
+    """Returns a 3D array where result[k + max_lag][i][j] is the correlation between
+    column i and column j shifted k months later, for every lag k from -max_lag to max_lag.
+
+    For each lag, the correlation between every pair of columns is computed at once as a
+    single matrix product over the overlapping months.
+
+    Preconditions:
+        - method in {'pearson', 'spearman'}
+        - 0 <= max_lag <= matrix.shape[0] - 3
+    """
+    n = matrix.shape[0]
+    result = np.empty((2 * max_lag + 1, matrix.shape[1], matrix.shape[1]))
+
+    for k in range(-max_lag, max_lag + 1):
+        leading = matrix[max(0, -k):n - max(0, k)]
+        lagging = matrix[max(0, k):n - max(0, -k)]
+        if method == 'spearman':
+            leading, lagging = rank_columns(leading), rank_columns(lagging)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result[k + max_lag] = standardize(leading).T @ standardize(lagging) \
+                / (leading.shape[0] - 1)
+
+    return result
+
+
+def correlations(months: list, method: str = 'pearson') -> pd.DataFrame:
+    """Returns a DataFrame of the correlations between every pair of series in months,
+    labelled by series name on both axes.
+
+    The result is cached by dataset version and date range, so repeated requests for the
+    same data are not recomputed.
+
+    Sample usage:
+    >>> from backend import load_data
+    >>> loaded_data = load_data(date(2020, 3, 1), date(2021, 10, 1), True)
+    >>> corr = correlations(loaded_data, 'spearman')
+    >>> corr['covid_cases']['unemployment_rate']
+    """
+    key = (dataset_key(months), method, None)
+
+    if key not in _CACHE:
+        names, matrix = series_matrix(months)
+        _CACHE[key] = pd.DataFrame(correlation_matrix(matrix, method),
+                                   index=names, columns=names)
+
+    return _CACHE[key]
+
+
+def lag_correlations(months: list, target: str = 'covid_cases', max_lag: int = 3,
+                     method: str = 'pearson') -> pd.DataFrame:
+    """Returns a DataFrame of the correlations between target and every other series in
+    months shifted by each lag from -max_lag to max_lag months, with one row per series
+    and one column per lag.
+
+    A positive lag compares target with the other series that many months later.
+    The result is cached by dataset version and date range.
+
+    Preconditions:
+        - method in {'pearson', 'spearman'}
+        - 0 <= max_lag <= len(months) - 3
+    """
+    key = (dataset_key(months), method, max_lag)
+
+    if key not in _CACHE:
+        names, matrix = series_matrix(months)
+        _CACHE[key] = (names, lagged_correlations(matrix, max_lag, method))
+
+    names, lagged = _CACHE[key]
+    row = names.index(target)
+    return pd.DataFrame(lagged[:, row, :].T, index=names,
+                        columns=list(range(-max_lag, max_lag + 1))).drop(index=target)
+
+
+def dataset_key(months: list) -> tuple[int, date, date, int]:
+    """Returns the key identifying months in a cache: the version of the dataset they were
+    loaded from, as set by backend.stamp_version, and their date range.
+
+    Two datasets covering the same date range, such as one loaded with predicted months
+    and one without, have different versions and therefore never share a cache entry. The
+    key only reads the first and last month, so it costs the same on every cache lookup
+    however large the dataset is.
+
+    months may be a list of Month objects, or the rows of a DataFrame made from them.
+    """
+    return (months[0].version, months[0].date, months[-1].date, len(months))
+
+
+def clear_cache() -> None:
+    """Removes every cached correlation result."""
+    _CACHE.clear()
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['datetime', 'numpy', 'pandas', 'memory', 'backend'],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import doctest
+
+    doctest.testmod()
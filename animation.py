@@ -0,0 +1,179 @@
+"""Evaluating the impact of COVID-19 on Canadians’ spending habits: animation module
+
+This module is responsible for precomputing the frames of the animated graph, so that
+any date range and set of categories can be animated by slicing them instead of rebuilding
+every frame from the data.
+
+Copyright and Usage Information
+===============================
+This file is Copyright (c) 2021 Ajinkya Bhosale.
+"""
+from datetime import date
+import numpy as np
+import plotly.graph_objects as go
+
+# The duration of each frame and of the transition between frames, in milliseconds
+FRAME_DURATION = 1200
+
+# The number of frames between two keyframes of a FrameBundle
+KEYFRAME_INTERVAL = 12
+
+
+class FrameBundle:
+    """The frames of the animated graph for every month and category of a dataset.
+
+    The bundle is built once per dataset. The styling of each category's trace is stored
+    once, every KEYFRAME_INTERVAL-th frame is stored in full as a keyframe, and every
+    other frame only stores the delta from the previous frame: the change in every
+    category's value. Any range of frames and subset of categories is rebuilt from the
+    nearest keyframe before it by a single vectorized cumulative sum, so the cost of a
+    range does not depend on how many frames come before it.
+
+    Missing (nan) values are stored in a separate mask and count as 0 in the keyframes and
+    deltas, so a missing value only hides its own frame, as when each frame is drawn on
+    its own.
+
+    >>> bundle = FrameBundle([date(2020, 3, 1), date(2020, 4, 1), date(2020, 5, 1)],
+    ...                      {'covid_cases': [10, 30, 20], 'csi': [1.0, 1.0, 2.0]})
+    >>> bundle.values(date(2020, 4, 1), date(2020, 5, 1), ['csi', 'covid_cases']).tolist()
+    [[1.0, 30.0], [2.0, 20.0]]
+    >>> bundle = FrameBundle([date(2020, month, 1) for month in range(1, 7)],
+    ...                      {'u': [1.0, float('nan'), 3.0, 4.0, 5.0, 6.0]})
+    >>> bundle.values(date(2020, 2, 1), date(2020, 4, 1), ['u']).tolist()
+    [[nan], [3.0], [4.0]]
+    """
+    # Private Instance Attributes:
+    #     - _dates: the month of each frame, in ascending order
+    #     - _labels: the label of each frame
+    #     - _columns: a dictionary mapping each category to its column in _deltas
+    #     - _keyframes: the value of every category in every KEYFRAME_INTERVAL-th frame,
+    #                   starting with the first, with one row per keyframe
+    #     - _deltas: the change in every category's value from the previous frame, with one
+    #                row per frame and one column per category (the first row is 0)
+    #     - _missing: whether each category's value is missing in each frame, with one row
+    #                 per frame and one column per category
+    _dates: np.ndarray
+    _labels: list[str]
+    _columns: dict[str, int]
+    _keyframes: np.ndarray
+    _deltas: np.ndarray
+    _missing: np.ndarray
+
+    def __init__(self, dates: list[date], series: dict[str, list]) -> None:
+        """Initialize this bundle with the value of every category in series for each of
+        dates.
+
+        Preconditions:
+            - dates == sorted(dates)
+            - all(len(series[category]) == len(dates) for category in series)
+        """
+        self._dates = np.array(dates, dtype='datetime64[M]')
+        self._labels = [str(dt) for dt in dates]
+        self._columns = {category: i for i, category in enumerate(series)}
+
+        values = np.array([series[category] for category in series], dtype=float)
+        values = values.reshape(len(series), len(dates)).T
+        self._missing = np.isnan(values)
+        filled = np.where(self._missing, 0.0, values)
+        self._keyframes = filled[::KEYFRAME_INTERVAL]
+        self._deltas = np.diff(filled, axis=0, prepend=filled[:1])
+
+    def frame_range(self, start_date: date, end_date: date) -> tuple[int, int]:
+        """Returns the index of the first frame in the date range and one past the last.
+        """
+        start = int(np.searchsorted(self._dates, np.datetime64(start_date, 'M'), 'left'))
+        end = int(np.searchsorted(self._dates, np.datetime64(end_date, 'M'), 'right'))
+        return (start, end)
+
+    def values(self, start_date: date, end_date: date, categories: list[str]) -> np.ndarray:
+        """Returns the values of categories in every frame of the date range, with one row
+        per frame and one column per category, and nan where a value is missing.
+        """
+        start, end = self.frame_range(start_date, end_date)
+        columns = [self._columns[category] for category in categories]
+        if end <= start:
+            return np.empty((0, len(columns)))
+
+        key = start // KEYFRAME_INTERVAL
+        first = key * KEYFRAME_INTERVAL
+        values = np.concatenate([self._keyframes[key, np.newaxis][:, columns],
+                                 self._deltas[first + 1:end][:, columns]]).cumsum(axis=0)
+        values = values[start - first:]
+        values[self._missing[start:end][:, columns]] = np.nan
+        return values
+
+    def figure(self, start_date: date, end_date: date, categories: list[str]) -> go.Figure:
+        """Returns the animated graph of categories over the date range.
+
+        Each category is normalized on a scale of 0-10 over the range, as in
+        graph.normalize_data, and each frame only updates the point of every trace.
+
+        Preconditions:
+            - the date range contains at least one frame
+        """
+        start, end = self.frame_range(start_date, end_date)
+        values = self.values(start_date, end_date, categories)
+        dates = self._dates[start:end].astype('datetime64[D]').astype(date)
+        labels = self._labels[start:end]
+
+        low, high = np.fmin.reduce(values, axis=0), np.fmax.reduce(values, axis=0)
+        span = np.where(high > low, high - low, 1.0)
+        normalized = (values - low) / span * 10.0
+
+        traces = [go.Scatter(x=[dates[0]], y=[normalized[0, i]], mode='markers',
+                             name=categories[i], marker={'size': 14},
+                             hovertemplate='Category = ' + categories[i]
+                             + '<br>date=%{x}<br>value=%{y}<extra></extra>')
+                  for i in range(len(categories))]
+        frames = [go.Frame(name=labels[k],
+                           data=[{'x': [dates[k]], 'y': [normalized[k, i]]}
+                                 for i in range(len(categories))],
+                           traces=list(range(len(categories))))
+                  for k in range(len(labels))]
+
+        fig = go.Figure(data=traces, frames=frames)
+        fig.update_layout(
+            title='Animated Covid-Related Graphs',
+            xaxis={'title': 'Time', 'range': [dates[0], dates[-1]]},
+            yaxis={'title': 'value', 'range': [-0.5, 12]},
+            legend={'title': 'Category'},
+            updatemenus=[{'type': 'buttons', 'direction': 'left', 'x': 0.1, 'y': 0,
+                          'xanchor': 'right', 'yanchor': 'top', 'showactive': False,
+                          'pad': {'r': 10, 't': 70},
+                          'buttons': [
+                              {'label': '&#9654;', 'method': 'animate',
+                               'args': [None, {'frame': {'duration': FRAME_DURATION,
+                                                         'redraw': False},
+                                               'transition': {'duration': FRAME_DURATION},
+                                               'fromcurrent': True, 'mode': 'immediate'}]},
+                              {'label': '&#9724;', 'method': 'animate',
+                               'args': [[None], {'frame': {'duration': 0, 'redraw': False},
+                                                 'transition': {'duration': 0},
+                                                 'mode': 'immediate'}]}]}],
+            sliders=[{'x': 0.1, 'y': 0, 'len': 0.9, 'xanchor': 'left', 'yanchor': 'top',
+                      'pad': {'b': 10, 't': 60},
+                      'currentvalue': {'prefix': 'animation_frame='},
+                      'steps': [{'label': label, 'method': 'animate',
+                                 'args': [[label], {'frame': {'duration': 0, 'redraw': False},
+                                                    'transition': {'duration': 0},
+                                                    'mode': 'immediate'}]}
+                                for label in labels]}])
+
+        return fig
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['datetime', 'numpy', 'plotly.graph_objects'],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import doctest
+
+    doctest.testmod()
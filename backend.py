@@ -8,10 +8,22 @@ Copyright and Usage Information
 This file is Copyright (c) 2021 Rafael Gacesa.
 """
 import csv
+import itertools
+from bisect import bisect_right
 from dataclasses import dataclass
 from datetime import date
+from functools import lru_cache
 from dateutil.relativedelta import relativedelta
-from prediction import Predictor
+import numpy as np
+from prediction import Predictor, select_models
+from categories import CategoryValues, CategoryObjects, BASKET_CATEGORIES, CPI_CATEGORIES, \
+    CSI_CATEGORIES, sub_categories
+from schema import Schema, QuarantinedRow, validate_header, parse_rows, \
+    COVID_SCHEMA, UNEMPLOYMENT_SCHEMA, BASKETS_SCHEMA, CPI_SCHEMA
+
+
+# A counter giving every dataset loaded or modified a new version, see stamp_version
+_VERSIONS = itertools.count(1)
 
 
 @dataclass
@@ -22,9 +34,11 @@ class Month:
             - date: a date object representing the date of the data
             - covid_cases: The number of cases recorded in the month
             - unemployment_rate: The unemployment rate during the month
-            - baskets: A dictionary containing the weighted percentages of specific commodities
-            - cpi: A dictionary containing the relative cost of specific commodities over time
-            - csi: A dictionary containing the 'spending index', calculated using cpi and baskets
+            - baskets: A mapping containing the weighted percentages of specific commodities
+            - cpi: A mapping containing the relative cost of specific commodities over time
+            - csi: A mapping containing the 'spending index', calculated using cpi and baskets
+            - version: the version of the dataset the month belongs to, shared by every
+              month loaded together and changed whenever the dataset is modified
 
         Representation Invariants:
             - self.date.month in {1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12}
@@ -33,12 +47,15 @@ class Month:
             - self.covid_rate >= 0.0
             - self.unemployment_rate >= 0.0
     """
+    __slots__ = ('date', 'covid_cases', 'unemployment_rate', 'baskets', 'cpi', 'csi',
+                 'version')
     date: date
     covid_cases: int
     unemployment_rate: float
-    baskets: dict
-    cpi: dict
-    csi: dict
+    baskets: CategoryObjects
+    cpi: CategoryValues
+    csi: CategoryValues
+    version: int
 
 
 @dataclass
@@ -54,9 +71,74 @@ class Basket:
         Representation Invariants:
             - value >= 0.0
     """
+    __slots__ = ('name', 'weight', 'categories')
     name: str
     weight: float
-    categories: dict
+    categories: CategoryValues
+
+
+@dataclass
+class Coverage:
+    """The months for which a dataset has rows, as sorted, non-overlapping intervals of
+    consecutive months.
+
+        Instance Attributes:
+            - starts: the first month of each interval
+            - ends: the last month of each interval
+
+        Representation Invariants:
+            - len(self.starts) == len(self.ends)
+            - all(self.starts[i] <= self.ends[i] for i in range(len(self.starts)))
+            - all(self.ends[i] < self.starts[i + 1] for i in range(len(self.starts) - 1))
+
+    >>> coverage = dataset_coverage(np.array(['2020-03', '2020-04', '2020-07'],
+    ...                                      dtype='datetime64[M]'))
+    >>> coverage.intervals()[0]
+    (datetime.date(2020, 3, 1), datetime.date(2020, 4, 1))
+    >>> len(coverage.intervals())
+    2
+    >>> coverage.contains(date(2020, 5, 1))
+    False
+    """
+    starts: np.ndarray
+    ends: np.ndarray
+
+    def contains(self, month: date) -> bool:
+        """Returns whether the dataset has rows for month."""
+        i = np.searchsorted(self.ends, np.datetime64(month, 'M'), 'left')
+        return bool(i < len(self.starts) and self.starts[i] <= np.datetime64(month, 'M'))
+
+    def intervals(self) -> list[tuple[date, date]]:
+        """Returns the first and last month of each interval."""
+        return [(start.item(), end.item()) for start, end in zip(self.starts, self.ends)]
+
+    def is_empty(self) -> bool:
+        """Returns whether the dataset has no rows at all."""
+        return len(self.starts) == 0
+
+
+def dataset_coverage(months: np.ndarray) -> Coverage:
+    """Returns the coverage of a dataset from the month of each of its rows.
+
+    Rows without a month (NaT) are ignored, so they can never become the start or end of
+    an interval.
+
+    >>> months = np.array(['2020-03', 'NaT', '2020-04', '2020-06'], dtype='datetime64[M]')
+    >>> [(str(start), str(end)) for start, end in dataset_coverage(months).intervals()]
+    [('2020-03-01', '2020-04-01'), ('2020-06-01', '2020-06-01')]
+    """
+    unique = np.unique(months[~np.isnat(months)])
+    breaks = np.flatnonzero(np.diff(unique) != np.timedelta64(1, 'M'))
+    return Coverage(np.concatenate([unique[:1], unique[breaks + 1]]),
+                    np.concatenate([unique[breaks], unique[-1:]]))
+
+
+def coverage_map(tables: list[dict]) -> dict[str, Coverage]:
+    """Returns the coverage of each of the tables returned by load_tables, keyed by the
+    name of the dataset.
+    """
+    names = ['covid', 'unemployment', 'baskets', 'cpi']
+    return {names[i]: dataset_coverage(tables[i]['month']) for i in range(len(names))}
 
 
 def load_csv(path: str, headers: bool) -> list[list[str]]:
@@ -77,7 +159,10 @@ def load_csv(path: str, headers: bool) -> list[list[str]]:
     return data
 
 
-def load_data(start_date: date, end_date: date, predict: bool = False) -> list[Month]:
+def load_data(start_date: date, end_date: date, predict: bool = False,
+              quarantine: list[QuarantinedRow] = None,
+              coverage: dict[str, Coverage] = None, select_model: bool = False,
+              model_errors: dict = None) -> list[Month]:
     """Returns a list of Month objects from the provided start date to the end date (inclusive).
 
     The returned list is sorted in ascending order, from earliest to latest.
@@ -87,6 +172,21 @@ def load_data(start_date: date, end_date: date, predict: bool = False) -> list[M
     basket data. However, when the flag is set to true, a linear regerssion model
     is used to predict the missing values.
 
+    When select_model is also True, the model used for each category is the one with the
+    lowest cross-validated error instead, and if model_errors is given, it is updated with
+    the cross-validated MAE and RMSE of every model for every category, as returned by
+    prediction.select_models.
+
+    Each dataset's header is validated against its schema before any rows are read, and
+    a SchemaError is raised if it does not match. Rows which can not be converted are
+    left out, and are appended to quarantine as QuarantinedRow objects if it is given.
+
+    Any range can be requested: it is clamped to the months covered by at least one
+    dataset, and months which no dataset covers are left out of the list. A dataset
+    missing from a month leaves its values empty (0 cases, a nan unemployment rate, or no
+    baskets and cpi). If coverage is given, it is updated with the Coverage of each
+    dataset, keyed by 'covid', 'unemployment', 'baskets' and 'cpi'.
+
     Preconditions:
         - start_date <= end_date
 
@@ -100,107 +200,234 @@ def load_data(start_date: date, end_date: date, predict: bool = False) -> list[M
     >>> start_dt = date(2020, 3, 1)
     >>> end_dt = date(2021, 10, 1)
     >>> loaded_data = load_data(start_dt, end_dt, True)
+    To report the rows which could not be read:
+    >>> bad_rows = []
+    >>> loaded_data = load_data(start_dt, end_dt, True, bad_rows)
+    >>> print('\\n'.join(str(row) for row in bad_rows))
+    To see which months each dataset covers:
+    >>> covered = {}
+    >>> loaded_data = load_data(date(1960, 1, 1), date(2030, 1, 1), False, None, covered)
+    >>> covered['baskets'].intervals()
+    To choose the best model for each category and report the errors of every model:
+    >>> errors = {}
+    >>> loaded_data = load_data(start_dt, end_dt, True, None, None, True, errors)
+    >>> errors['Total']
+    """
+    tables = load_tables(quarantine)
+    covered = coverage_map(tables)
+    if coverage is not None:
+        coverage.update(covered)
+
+    data = build_months(tables, start_date, end_date, covered)
+
+    if predict:
+        complete_dataset(data, select_model, model_errors)
+    stamp_version(data)
+    return data
+
+
+def stamp_version(data: list[Month]) -> None:
+    """Gives every month in data the same new version, so that results cached for the
+    dataset before it was loaded or modified are never reused for it.
     """
-    raw_data = [load_csv('covid-19_dataset.csv', False),
-                load_csv('unemployment-rate_dataset.csv', False),
-                load_csv('weighted-baskets_dataset.csv', False),
-                load_csv('consumer-price-index_dataset.csv', False)]
+    version = next(_VERSIONS)
+    for month in data:
+        month.version = version
+
+
+def load_tables(quarantine: list[QuarantinedRow] = None) -> list[dict]:
+    """Returns the typed columns of the covid, unemployment, baskets and cpi datasets, in
+    that order.
+
+    The files are loaded one at a time, and the raw rows of each are released as soon as
+    they have been converted, so at most one raw file is held in memory at once.
+    """
+    return [load_table('covid-19_dataset.csv', COVID_SCHEMA, quarantine),
+            load_table('unemployment-rate_dataset.csv', UNEMPLOYMENT_SCHEMA, quarantine),
+            load_table('weighted-baskets_dataset.csv', BASKETS_SCHEMA, quarantine),
+            load_table('consumer-price-index_dataset.csv', CPI_SCHEMA, quarantine)]
+
+
+def build_months(tables: list[dict], start_date: date, end_date: date,
+                 coverage: dict[str, Coverage] = None) -> list[Month]:
+    """Returns a list of Month objects from the provided start date to the end date
+    (inclusive), read from the tables returned by load_tables.
+
+    The range is clamped to the months covered by at least one of the tables, and months
+    covered by none of them are skipped without being read. Datasets which do not cover a
+    month are not searched for it.
+    """
+    if coverage is None:
+        coverage = coverage_map(tables)
+    datasets = [coverage[name] for name in ['covid', 'unemployment', 'baskets', 'cpi']]
+    if all(dataset.is_empty() for dataset in datasets):
+        return []
+
+    first = min(dataset.starts[0] for dataset in datasets if not dataset.is_empty())
+    last = max(dataset.ends[-1] for dataset in datasets if not dataset.is_empty())
+    start_date = max(start_date, first.item())
+    end_date = min(end_date, last.item())
 
     data = []
     rd = relativedelta(end_date, start_date)
-    for i in range(rd.months + (rd.years * 12) + 1):
+    for i in range(max(rd.months + (rd.years * 12) + 1, 0)):
         dt = date((start_date + relativedelta(months=i)).year,
                   (start_date + relativedelta(months=i)).month, 1)
+        has_data = [dataset.contains(dt) for dataset in datasets]
+        if not any(has_data):
+            continue
 
-        covid_cases = read_covid_data(raw_data[0], dt)
-        unemployment_rate = read_unemployment_data(raw_data[1], dt)
-        baskets = read_baskets_data(raw_data[2], dt)
-        cpi = read_cpi_data(raw_data[3], dt)
+        covid_cases = read_covid_data(tables[0], dt) if has_data[0] else 0
+        unemployment_rate = read_unemployment_data(tables[1], dt) if has_data[1] \
+            else float('nan')
+        baskets = read_baskets_data(tables[2], dt) if has_data[2] \
+            else CategoryObjects(registry=BASKET_CATEGORIES)
+        cpi = read_cpi_data(tables[3], dt) if has_data[3] \
+            else CategoryValues(registry=CPI_CATEGORIES)
         csi = compute_csi(baskets, cpi)
 
-        data.append(Month(dt, covid_cases, unemployment_rate, baskets, cpi, csi))
+        data.append(Month(dt, covid_cases, unemployment_rate, baskets, cpi, csi, 0))
 
-    if predict:
-        complete_dataset(data)
     return data
 
 
-def read_covid_data(data: list[list[str]], month: date) -> int:
-    """Returns a tuple containing COVID case counts and the COVID transmission
-    rate for a specified month.
+def load_table(path: str, schema: Schema, quarantine: list[QuarantinedRow] = None) -> dict:
+    """Returns the columns of schema loaded from the .csv file at path as typed arrays,
+    after validating the file's header against schema.
     """
-    cases = 0
+    rows = load_csv(path, True)
+    validate_header(schema, rows[0])
+    return parse_rows(schema, rows[1:], quarantine)
 
-    for row in data:
-        row_year = int(row[3].split('-')[0])
-        row_month = int(row[3].split('-')[1])
-        dt = date(row_year, row_month, 1)
 
-        # row[0] contains province ID, ID 1 is statistics for all of Canada
-        if int(row[0]) == 1 and month == dt:
-            cases = cases + int(row[15])
+@lru_cache(maxsize=None)
+def clean_name(name: str) -> str:
+    """Returns the name of a commodity with every character other than letters and spaces
+    removed.
 
-    return cases
+    The result is cached, so each distinct name is only cleaned once and every month shares
+    the same string object for it.
 
+    >>> clean_name('Household operations, furnishings and equipment')
+    'Household operations furnishings and equipment'
+    """
+    return ''.join([letter for letter in name if letter.isalpha() or letter == ' '])
+
+
+def read_covid_data(table: dict, month: date) -> int:
+    """Returns the number of COVID cases recorded in Canada for a specified month.
+    """
+    # province ID 1 is statistics for all of Canada
+    rows = (table['province'] == 1) & (table['month'] == np.datetime64(month, 'M'))
+    return int(table['cases'][rows].sum())
 
-def read_unemployment_data(data: list[list[str]], month: date) -> float:
+
+def read_unemployment_data(table: dict, month: date) -> float:
     """Returns the float unemployment rate for a specified month.
     """
-    start_date = date(1960, 1, 1)
-    row = relativedelta(month, start_date).months + (relativedelta(month, start_date).years * 12)
-    return float(data[row][1])
+    rows = table['month'] == np.datetime64(month, 'M')
+    return float(table['rate'][rows][0])
+
+
+def coordinate_product(coordinate: str) -> int:
+    """Returns the product number of a coordinate of the weighted baskets dataset, which
+    is the number after its first '.', or -1 if the coordinate is malformed.
+
+    >>> coordinate_product('1.21')
+    21
+    >>> coordinate_product('1.x')
+    -1
+    """
+    _, _, product = coordinate.partition('.')
+    return int(product) if product.isdigit() else -1
 
 
-def read_baskets_data(data: list[list[str]], month: date) -> dict:
+def read_baskets_data(table: dict, month: date) -> CategoryObjects:
     """Returns a dictionary containing the weighted baskets for specific commodities
     for a specified month.
+
+    Every sub-category row belongs to the basket with the greatest coordinate below its
+    own, so rows are matched to their basket by coordinate rather than by their order in
+    the table. Sub-category rows whose basket row was quarantined, or whose coordinate is
+    malformed, are left out instead of being filed under another basket.
+
+    >>> from schema import parse_rows
+    >>> rows = [['2020-03', '', '', name, '', '', '', '', '', coordinate, value]
+    ...         for name, coordinate, value in [('All-items', '1.1', '100'),
+    ...                                         ('Food', '1.2', 'unknown'),
+    ...                                         ('Meat', '1.3', '3.5'),
+    ...                                         ('Shelter', '1.21', '30'),
+    ...                                         ('Rent', '1.22', '7')]]
+    >>> quarantine = []
+    >>> table = parse_rows(BASKETS_SCHEMA, rows, quarantine)
+    >>> baskets = read_baskets_data(table, date(2020, 3, 1))
+    >>> sorted(baskets), len(quarantine)
+    (['Allitems', 'Shelter'], 1)
+    >>> dict(baskets['Shelter'].categories)
+    {'Rent': 7.0}
     """
-    basket_coords = [1.1, 1.2, 1.21, 1.35, 1.67, 1.83, 1.92, 1.117]
-    baskets = {}
-
-    idx = 0
-    current = ''
-    for row in data:
-        dt = date(int(row[0].split('-')[0]), int(row[0].split('-')[1]), 1)
-        if month == dt:
-            if idx < len(basket_coords) and float(row[9]) == basket_coords[idx]:
-                idx = idx + 1
-                current = ''.join([letter for letter in row[3]
-                                   if letter.isalpha() or letter == ' '])
-                baskets[current] = Basket(row[3], float(row[10]), {})
-            else:
-                baskets[current].categories[row[3]] = float(row[10])
+    basket_products = [1, 2, 21, 35, 67, 83, 92, 117]
+    baskets = CategoryObjects(registry=BASKET_CATEGORIES)
+    owners = {}
+
+    rows = np.flatnonzero(table['month'] == np.datetime64(month, 'M'))
+    products = [coordinate_product(str(table['coordinate'][row])) for row in rows]
+
+    for row, product in zip(rows, products):
+        if product in basket_products:
+            name = str(table['name'][row])
+            owners[product] = clean_name(name)
+            baskets[owners[product]] = Basket(
+                name, float(table['value'][row]),
+                CategoryValues(registry=sub_categories(owners[product])))
+
+    for row, product in zip(rows, products):
+        owner = basket_products[bisect_right(basket_products, product) - 1]
+        if product > 0 and product not in basket_products and owner in owners:
+            baskets[owners[owner]].categories[str(table['name'][row])] = \
+                float(table['value'][row])
 
     return baskets
 
 
-def read_cpi_data(data: list[list[str]], month: date) -> dict:
+def read_cpi_data(table: dict, month: date) -> CategoryValues:
     """Returns a dictionary of the relative cost of specific commodities for a specified
     month.
     """
-    cpi = {}
-
-    for row in data:
-        dt = date(int(row[0].split('-')[0]), int(row[0].split('-')[1]), 1)
-        if row[1] == 'Canada' and dt == month:
-            cpi[''.join([letter for letter in row[3] if letter.isalpha() or letter == ' '])]\
-                = float(row[10])
-
-    return cpi
+    rows = (table['region'] == 'Canada') & (table['month'] == np.datetime64(month, 'M'))
+    return CategoryValues({clean_name(str(name)): float(value)
+                           for name, value in zip(table['name'][rows], table['value'][rows])},
+                          CPI_CATEGORIES)
 
 
-def compute_csi(baskets: dict, cpi: dict) -> dict:
-    """Returns a dictionary containing the consumer spending index, which is calculated per
+def compute_csi(baskets: CategoryObjects, cpi: CategoryValues) -> CategoryValues:
+    """Returns a mapping containing the consumer spending index, which is calculated per
     each commodity using basket data and the consumer price index.
+
+    Commodities without a consumer price index for the month are left out, and if any is
+    missing, the month is only partially known, so its 'Total' is 0 and is predicted by
+    complete_dataset instead of being used to train it.
+
+    >>> baskets = CategoryObjects({'Food': Basket('Food', 20.0, CategoryValues()),
+    ...                            'Shelter': Basket('Shelter', 30.0, CategoryValues())})
+    >>> compute_csi(baskets, CategoryValues({'Food': 150.0, 'Shelter': 100.0}))['Total']
+    60.0
+    >>> partial = compute_csi(baskets, CategoryValues({'Food': 150.0}))
+    >>> partial['Food'], partial['Total']
+    (30.0, 0.0)
     """
-    csi = {}
+    csi = CategoryValues(registry=CSI_CATEGORIES)
+    complete = True
 
     for basket in baskets:
         if basket == 'Allitems':
             continue
+        if basket not in cpi:
+            complete = False
+            continue
         csi[basket] = (baskets[basket].weight / 100.0) * cpi[basket]
 
-    csi['Total'] = sum(csi.values())
+    csi['Total'] = sum(csi.values()) if complete else 0.0
     return csi
 
 
@@ -226,34 +453,67 @@ def predict_next_wave(data: list[Month], next_cases: list[int], category: str =
     for count in next_cases:
         start_date = start_date + relativedelta(months=1)
         pred_csi = predictor.make_prediction(count)
-        month = Month(start_date, count, 0.0, {}, {}, {category: pred_csi})
+        month = Month(start_date, count, 0.0, CategoryObjects(registry=BASKET_CATEGORIES),
+                      CategoryValues(registry=CPI_CATEGORIES),
+                      CategoryValues({category: pred_csi}, CSI_CATEGORIES), 0)
         data.append(month)
 
+    stamp_version(data)
 
-def complete_dataset(data: list[Month]) -> None:
+
+def complete_dataset(data: list[Month], select_model: bool = False,
+                     model_errors: dict = None) -> None:
     """Fills in missing CSI values where data for computation is not
-    available using a predictive model based on existing data."""
+    available using a predictive model based on existing data.
+
+    By default a linear regression model is used for every category. When select_model
+    is True, the model with the lowest cross-validated error is chosen for each category
+    instead, using prediction.select_models, which also updates model_errors with the
+    errors of every model if it is given, and the chosen model is then fitted on every
+    month with real data rather than on a random 75% of them."""
     cases = []
+    previous_cases = []
     csi = []
+    previous = {month.date: data[i - 1].covid_cases if i > 0 else month.covid_cases
+                for i, month in enumerate(data)}
 
     for month in data:
         if month.csi['Total'] > 0.0:
             cases.append(month.covid_cases)
+            previous_cases.append(previous[month.date])
             csi.append(month.csi)
 
-    for category in csi[0]:
+    # nothing can be predicted without at least two months of real data to learn from
+    if len(cases) < 2:
+        return
+
+    # only the categories with a value in every month used for training are predicted
+    categories = [category for category in csi[0] if all(category in c for c in csi)]
+    if select_model:
+        models = select_models(cases, {category: [c[category] for c in csi]
+                                       for category in categories}, previous_cases,
+                               errors=model_errors)
+    else:
+        models = {category: 'linear' for category in categories}
+
+    for category in categories:
         csi_for_category = [c[category] for c in csi]
-        predictor = Predictor(cases, csi_for_category)
+        predictor = Predictor(cases, csi_for_category, models[category], previous_cases,
+                              select_model)
         for month in data:
             if category not in month.csi:
-                month.csi[category] = predictor.make_prediction(month.covid_cases)
+                month.csi[category] = predictor.make_prediction(month.covid_cases,
+                                                                previous[month.date])
             elif month.csi[category] <= 0.0:
-                month.csi['Predicted Total'] = predictor.make_prediction(month.covid_cases)
+                month.csi['Predicted Total'] = predictor.make_prediction(month.covid_cases,
+                                                                         previous[month.date])
 
     for month in data:
-        if month.csi['Total'] <= 0.0:
+        if month.csi['Total'] <= 0.0 and 'Predicted Total' in month.csi:
             month.csi['Total'] = sum(month.csi.values()) - month.csi['Predicted Total']
 
+    stamp_version(data)
+
 
 if __name__ == '__main__':
     import python_ta
@@ -261,7 +521,9 @@ if __name__ == '__main__':
 
     python_ta.contracts.check_all_contracts()
     python_ta.check_all(config={
-        'extra-imports': ['csv', 'datetime', 'dateutil.relativedelta', 'prediction'],
+        'extra-imports': ['csv', 'itertools', 'bisect', 'datetime', 'functools',
+                          'dateutil.relativedelta', 'numpy', 'prediction', 'categories',
+                          'schema'],
         'allowed-io': ['load_csv'],
         'max-line-length': 100,
         'disable': ['R1705', 'C0200']
@@ -0,0 +1,242 @@
+"""Evaluating the impact of COVID-19 on Canadians’ spending habits: categories module
+
+This module is responsible for storing the per-category values of each month compactly.
+
+Every category name is registered once and given a small integer id, and each month stores
+its values in a fixed-size array indexed by those ids, instead of a dictionary holding its
+own copy of every name. Each kind of mapping (baskets, CPI and CSI) has its own registry,
+as do the sub-categories of each basket, so the arrays of one kind only have a slot for
+the names of that kind.
+
+Copyright and Usage Information
+===============================
+This file is Copyright (c) 2021 Rafael Gacesa.
+"""
+import math
+from abc import abstractmethod
+from array import array
+from copy import deepcopy
+from collections.abc import MutableMapping
+from typing import Iterable, Iterator
+
+
+class CategoryRegistry:
+    """A registry giving every category name a unique, small integer id.
+
+    Ids are given in the order names are first registered, starting at 0.
+
+    >>> registry = CategoryRegistry()
+    >>> registry.id('Food')
+    0
+    >>> registry.id('Shelter')
+    1
+    >>> registry.id('Food')
+    0
+    >>> registry.name(1)
+    'Shelter'
+    """
+    # Private Instance Attributes:
+    #     - _ids: a dictionary mapping each registered name to its id
+    #     - _names: the registered names, indexed by id
+    __slots__ = ('_ids', '_names')
+    _ids: dict[str, int]
+    _names: list[str]
+
+    def __init__(self) -> None:
+        self._ids = {}
+        self._names = []
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def id(self, name: str) -> int:
+        """Returns the id of name, registering it first if it is new."""
+        if name not in self._ids:
+            self._ids[name] = len(self._names)
+            self._names.append(name)
+        return self._ids[name]
+
+    def find(self, name: str) -> int:
+        """Returns the id of name, or -1 if it has not been registered."""
+        return self._ids.get(name, -1)
+
+    def name(self, category_id: int) -> str:
+        """Returns the name registered with category_id."""
+        return self._names[category_id]
+
+
+# The registry of top-level basket names, shared by the baskets of every month
+BASKET_CATEGORIES = CategoryRegistry()
+
+# The registry of CPI product names, shared by the cpi of every month
+CPI_CATEGORIES = CategoryRegistry()
+
+# The registry of CSI category names, shared by the csi of every month
+CSI_CATEGORIES = CategoryRegistry()
+
+# Every module-level registry, by name, used to restore pickled category mappings. The
+# sub-category registry of each basket is added by sub_categories as 'SUB_CATEGORIES:<name>'.
+REGISTRIES = {'BASKET_CATEGORIES': BASKET_CATEGORIES, 'CPI_CATEGORIES': CPI_CATEGORIES,
+              'CSI_CATEGORIES': CSI_CATEGORIES}
+
+
+def sub_categories(basket: str) -> CategoryRegistry:
+    """Returns the registry of the sub-category names of basket, shared by that basket in
+    every month, creating it the first time it is needed.
+
+    >>> sub_categories('Food') is sub_categories('Food')
+    True
+    >>> sub_categories('Food') is sub_categories('Shelter')
+    False
+    """
+    return REGISTRIES.setdefault('SUB_CATEGORIES:' + basket, CategoryRegistry())
+
+
+class CategoryMapping(MutableMapping):
+    """An abstract mapping from category names to values, stored in a fixed-size sequence
+    indexed by the ids of a CategoryRegistry.
+
+    It behaves like a dictionary, iterating over its categories in the order they were
+    registered. Mappings of the same kind share one registry; a mapping created without a
+    registry gets one of its own. Subclasses decide how values are stored and how a
+    missing value is marked.
+    """
+    # Private Instance Attributes:
+    #     - _registry: the registry the ids of the categories come from
+    #     - _values: the value of each category, indexed by id
+    __slots__ = ('_registry', '_values')
+    _registry: CategoryRegistry
+
+    def __init__(self, values: dict = None, registry: CategoryRegistry = None) -> None:
+        self._registry = registry if registry is not None else CategoryRegistry()
+        self._values = self._storage(len(self._registry))
+        if values is not None:
+            self.update(values)
+
+    @abstractmethod
+    def _storage(self, size: int) -> object:
+        """Returns a new sequence of size missing values."""
+
+    @abstractmethod
+    def _is_missing(self, value: object) -> bool:
+        """Returns whether value marks a category without a value."""
+
+    def __getitem__(self, name: str) -> object:
+        category_id = self._registry.find(name)
+        if category_id < 0 or category_id >= len(self._values) \
+                or self._is_missing(self._values[category_id]):
+            raise KeyError(name)
+        return self._values[category_id]
+
+    def __setitem__(self, name: str, value: object) -> None:
+        category_id = self._registry.id(name)
+        if category_id >= len(self._values):
+            self._values.extend(self._storage(len(self._registry) - len(self._values)))
+        self._values[category_id] = value
+
+    def __delitem__(self, name: str) -> None:
+        if name not in self:
+            raise KeyError(name)
+        self._values[self._registry.find(name)] = self._storage(1)[0]
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._registry.name(i) for i in range(len(self._values))
+                if not self._is_missing(self._values[i]))
+
+    def __len__(self) -> int:
+        return sum(1 for value in self._values if not self._is_missing(value))
+
+    def __repr__(self) -> str:
+        return type(self).__name__ + '(' + repr(dict(self)) + ')'
+
+    def __copy__(self) -> 'CategoryMapping':
+        copy = type(self)(registry=self._registry)
+        copy._values = self._values[:]
+        return copy
+
+    def __deepcopy__(self, memo: dict) -> 'CategoryMapping':
+        # the registry is shared between every month, so it is never copied
+        copy = type(self)(registry=self._registry)
+        copy._values = self._storage(0)
+        copy._values.extend(deepcopy(value, memo) for value in self._values)
+        return copy
+
+    def __reduce__(self) -> tuple:
+        for name, registry in REGISTRIES.items():
+            if registry is self._registry:
+                return (from_registry, (type(self), name, dict(self)))
+        return (type(self), (dict(self), self._registry))
+
+
+class CategoryValues(CategoryMapping):
+    """A category mapping of float values, stored in an array of doubles.
+
+    Categories without a value are stored as nan.
+
+    >>> values = CategoryValues({'Food': 1.5, 'Shelter': 2.0})
+    >>> values['Food']
+    1.5
+    >>> 'Total' in values
+    False
+    >>> sum(values.values())
+    3.5
+    """
+    __slots__ = ()
+    _values: array
+
+    def _storage(self, size: int) -> array:
+        return array('d', [math.nan]) * size
+
+    def _is_missing(self, value: float) -> bool:
+        return math.isnan(value)
+
+
+class CategoryObjects(CategoryMapping):
+    """A category mapping of arbitrary objects, stored in a list.
+
+    Categories without a value are stored as None.
+    """
+    __slots__ = ()
+    _values: list
+
+    def _storage(self, size: int) -> list:
+        return [None] * size
+
+    def _is_missing(self, value: object) -> bool:
+        return value is None
+
+
+def from_registry(mapping_type: type, registry: str, values: dict) -> CategoryMapping:
+    """Returns a category mapping of mapping_type holding values, using the module-level
+    registry with the given name. This is used to restore pickled category mappings.
+    """
+    if registry.startswith('SUB_CATEGORIES:'):
+        return mapping_type(values, sub_categories(registry[len('SUB_CATEGORIES:'):]))
+    return mapping_type(values, REGISTRIES[registry])
+
+
+def category_column(mappings: Iterable[CategoryMapping], name: str) -> list[float]:
+    """Returns the value of the category name in each of mappings, with nan where it has
+    no value. This replaces pandas' .str accessor, which only looks inside dictionaries.
+
+    >>> category_column([CategoryValues({'Food': 1.0}), CategoryValues()], 'Food')
+    [1.0, nan]
+    """
+    return [mapping.get(name, math.nan) for mapping in mappings]
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['math', 'abc', 'array', 'copy', 'collections.abc', 'typing'],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import doctest
+
+    doctest.testmod()
@@ -0,0 +1,98 @@
+"""Evaluating the impact of COVID-19 on Canadians’ spending habits: drill-down module
+
+This module is responsible for querying the sub-categories of each consumer basket, and
+computing their consumer spending index on demand.
+
+The top-level CSI is computed for every month when the data is loaded, while the CSI of
+the sub-categories is only computed when a basket is opened, and is then memoized.
+
+Copyright and Usage Information
+===============================
+This file is Copyright (c) 2021 Rafael Gacesa.
+"""
+import math
+import pandas as pd
+from analysis import dataset_key
+from backend import clean_name
+from memory import SpillCache
+
+# The sub-category CSI computed so far, keyed by basket, dataset version and date range
+_SUBCATEGORY_CSI = SpillCache('subcategories')
+
+
+def category_tree(months: list) -> dict[str, list[str]]:
+    """Returns a dictionary mapping every top-level basket in months to the names of its
+    sub-categories, in the order they first appear.
+
+    months may be a list of Month objects, or the rows of a DataFrame made from them.
+    """
+    tree = {}
+
+    for month in months:
+        for name, basket in month.baskets.items():
+            children = tree.setdefault(name, [])
+            for sub in basket.categories:
+                if sub not in children:
+                    children.append(sub)
+
+    return tree
+
+
+def subcategory_value(month: object, parent: str, sub: str) -> float:
+    """Returns the consumer spending index of the sub-category sub of the basket parent in
+    month, or nan if its weight or price index is not available.
+
+    As with backend.compute_csi, this is the weight of the sub-category, as a percentage,
+    multiplied by its consumer price index.
+    """
+    basket = month.baskets.get(parent)
+    if basket is None or sub not in basket.categories:
+        return math.nan
+    return basket.categories[sub] / 100.0 * month.cpi.get(clean_name(sub), math.nan)
+
+
+def subcategory_csi(months: list, parent: str) -> pd.DataFrame:
+    """Returns a DataFrame of the consumer spending index of every sub-category of the
+    basket parent, with one row per month and one column per sub-category.
+
+    The result is memoized by basket and by the dataset version and date range of months,
+    as given by analysis.dataset_key, so each basket is only computed the first time it is
+    opened for a range, and a cache hit does not look at any other basket.
+
+    Sample usage:
+    >>> from datetime import date
+    >>> from backend import load_data
+    >>> loaded_data = load_data(date(2020, 3, 1), date(2021, 10, 1))
+    >>> food = subcategory_csi(loaded_data, 'Food')
+    """
+    key = (parent, dataset_key(months))
+
+    if key not in _SUBCATEGORY_CSI:
+        subs = category_tree(months).get(parent, [])
+        _SUBCATEGORY_CSI[key] = pd.DataFrame(
+            [[subcategory_value(month, parent, sub) for sub in subs] for month in months],
+            index=[month.date for month in months], columns=subs)
+
+    return _SUBCATEGORY_CSI[key]
+
+
+def clear_cache() -> None:
+    """Removes every memoized sub-category result."""
+    _SUBCATEGORY_CSI.clear()
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['math', 'pandas', 'analysis', 'backend', 'memory', 'datetime'],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import doctest
+
+    doctest.testmod()
@@ -0,0 +1,159 @@
+"""Evaluating the impact of COVID-19 on Canadians’ spending habits: export module
+
+This module is responsible for rendering graphs headlessly, without a browser, so that
+batches of figures can be written to disk as report packs.
+
+Copyright and Usage Information
+===============================
+This file is Copyright (c) 2021 Ajinkya Bhosale.
+"""
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+import graph
+
+# The name of the plotly.js bundle shared by every exported html file
+PLOTLY_BUNDLE = 'plotly.min.js'
+
+
+@dataclass
+class ExportJob:
+    """A single graph to be rendered by export_batch.
+
+        Instance Attributes:
+            - name: the file name (without extension) the graph is written to
+            - start_date: the first month of the graph
+            - end_date: the last month of the graph
+            - categories: the attributes to plot, ignored by the 'bar' chart
+            - chart: the type of graph, one of 'line', 'animated' or 'bar'
+
+        Representation Invariants:
+            - self.name != ''
+            - self.start_date <= self.end_date
+            - self.chart in {'line', 'animated', 'bar'}
+    """
+    name: str
+    start_date: date
+    end_date: date
+    categories: list[str]
+    chart: str = 'line'
+
+
+def build_figure(job: ExportJob) -> object:
+    """Returns the plotly figure described by the given job.
+    """
+    filtered_data = graph.get_filtered_data(job.start_date, job.end_date)
+
+    if job.chart == 'line':
+        return graph.line_figure(filtered_data, job.categories)
+    elif job.chart == 'animated':
+        return graph.animated_figure(filtered_data, job.categories)
+    elif job.chart == 'bar':
+        return graph.csi_bar_figure(filtered_data)
+    else:
+        raise ValueError('Unknown chart type: ' + job.chart)
+
+
+def render_job(job: ExportJob, out_dir: str, fmt: str) -> str:
+    """Renders a single job into out_dir and returns the path of the written file.
+
+    Html files reference the shared plotly.js bundle by relative path instead of
+    embedding their own copy, and json files never reference plotly.js at all, so
+    neither needs network access to be opened.
+    """
+    fig = build_figure(job)
+    path = os.path.join(out_dir, job.name + '.' + fmt)
+
+    if fmt == 'html':
+        fig.write_html(path, include_plotlyjs=PLOTLY_BUNDLE, full_html=True,
+                       auto_play=False)
+    else:
+        pio.write_json(fig, path)
+
+    return path
+
+
+def pool_context() -> multiprocessing.context.BaseContext:
+    """Returns the multiprocessing context the worker processes of export_batch are
+    started with.
+
+    This is always the platform's default start method. On Linux that is 'fork', so every
+    worker inherits the dataset graph has already loaded. macOS and Windows default to
+    'spawn' (forking after numpy and sklearn have loaded system frameworks can crash the
+    child on macOS), so there every worker re-imports graph and reloads the dataset once,
+    rather than once per job.
+    """
+    return multiprocessing.get_context()
+
+
+def write_plotly_bundle(out_dir: str) -> str:
+    """Writes the plotly.js bundle into out_dir once and returns its path.
+
+    The bundle is only written if it is not already present.
+    """
+    path = os.path.join(out_dir, PLOTLY_BUNDLE)
+
+    if not os.path.exists(path):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(get_plotlyjs())
+
+    return path
+
+
+def export_batch(jobs: list[ExportJob], out_dir: str, fmt: str = 'html',
+                 max_workers: int = None) -> list[str]:
+    """Renders every job into out_dir in parallel and returns the written paths, in the
+    same order as jobs.
+
+    The jobs are split between a pool of worker processes started from pool_context().
+    Where workers are forked (on Linux), they share the dataset graph loaded at import
+    time in the parent process. Where they are spawned (on macOS and Windows), each worker
+    reloads the dataset when it imports graph, once before rendering any of its jobs.
+
+    Preconditions:
+        - fmt in {'html', 'json'}
+        - all(job.name != other.name for job in jobs for other in jobs if job is not other)
+
+    Sample usage:
+    # NOTE: commented instead of written as a doctest as otherwise doctest.testmod()
+     will write files to disk
+    # jobs = [ExportJob('cases', date(2020, 3, 1), date(2021, 2, 1), ['covid_cases']),
+    #         ExportJob('csi', date(2020, 3, 1), date(2021, 10, 1), [], 'bar')]
+    # export_batch(jobs, 'reports')
+    """
+    if fmt not in {'html', 'json'}:
+        raise ValueError('Unknown export format: ' + fmt)
+
+    os.makedirs(out_dir, exist_ok=True)
+    if fmt == 'html':
+        write_plotly_bundle(out_dir)
+
+    if len(jobs) <= 1:
+        return [render_job(job, out_dir, fmt) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=pool_context()) as executor:
+        chunksize = max(1, len(jobs) // ((max_workers or os.cpu_count() or 1) * 4))
+        return list(executor.map(render_job, jobs, [out_dir] * len(jobs),
+                                 [fmt] * len(jobs), chunksize=chunksize))
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['os', 'multiprocessing', 'concurrent.futures', 'dataclasses',
+                          'datetime', 'plotly.io', 'plotly.offline', 'graph'],
+        'allowed-io': ['write_plotly_bundle'],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import doctest
+
+    doctest.testmod()
@@ -9,15 +9,36 @@ This file is Copyright (c) 2021 Ajinkya Bhosale.
 from datetime import date
 import plotly.express as px
 import plotly.io as pio
+import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 from backend import load_data
+from categories import category_column
+import analysis
+import rolling
+import animation
+import drilldown
+from memory import SpillCache
 
 # Load in all the data available(including the predicted data from Mar 2020 to Oct 2021)
-main_data = load_data(date(2020, 3, 1), date(2021, 10, 1), True)
+# The months covered by each dataset, filled in by load_data
+COVERAGE = {}
+main_data = load_data(date(2020, 3, 1), date(2021, 10, 1), True, None, COVERAGE)
 main_data = pd.DataFrame(main_data)  # turned the data into DataFrame object
 
+# The top-level CSI categories displayed in the bar chart
+CSI_CATEGORIES = ['Shelter', 'Food', 'Transportation',
+                  'Household operations furnishings and equipment',
+                  'Recreation education and reading', 'Health and personal care',
+                  'Alcoholic beverages tobacco products and recreational cannabis']
+
+# The main_data with rolling statistics added, keyed by window size
+_ROLLING_DATA = SpillCache('rolling')
+
+# The animation frames of the main_data, built by frame_bundle
+_FRAME_BUNDLE = None
+
 
 def get_filtered_data(start_date: date, end_date: date) -> pd.DataFrame:
     """Returns a copy of the data for a selected date range
@@ -38,6 +59,40 @@ def get_filtered_data(start_date: date, end_date: date) -> pd.DataFrame:
     return filtered_data
 
 
+def available_range() -> tuple[date, date]:
+    """Returns the first and last month of the main_data which can be graphed without
+    predicting from missing data: the months that the covid dataset covers, since the
+    predicted values are based on the case counts.
+    """
+    dates = [dt for dt in main_data['date'] if COVERAGE['covid'].contains(dt)]
+    if not dates:
+        dates = main_data['date'].tolist()
+    return (min(dates), max(dates))
+
+
+def get_rolling_data(start_date: date, end_date: date, window: int) -> pd.DataFrame:
+    """Returns a copy of the data for a selected date range, with derived columns for the
+    rolling statistics of every series over the given window.
+
+    The statistics are computed once per window over all of the main_data, so the windows
+    at the start of the range include the months before it when they are available.
+
+    Sample usage:
+    # NOTE: some lines are commented instead of written as doctests as otherwise
+     doctest.testmod() will cause browser windows to open with graphs
+    To plot the 3 month rolling mean of Covid Cases from March 2020 to February 2021:
+    >>> start_dt = date(2020, 3, 1)
+    >>> end_dt = date(2021, 2, 1)
+    >>> rolling_data = get_rolling_data(start_dt, end_dt, 3)
+    # line_graph(rolling_data, ['covid_cases', 'covid_cases mean 3'])
+    """
+    if window not in _ROLLING_DATA:
+        _ROLLING_DATA[window] = rolling.add_rolling_columns(main_data, window)
+
+    data = _ROLLING_DATA[window]
+    return data.loc[(data['date'] >= start_date) & (data['date'] <= end_date)]
+
+
 def normalize_data(filtered_data: pd.DataFrame, usr_choice: list) -> object:
     """Return the attribute values that are normalized form the provided filtered_data and
     a list containing attribute names to normalize.
@@ -66,17 +121,65 @@ def normalize_data(filtered_data: pd.DataFrame, usr_choice: list) -> object:
             temp = np.reshape(arr, arr.__len__())
             list_so_far.append(temp.tolist())
         elif choice == 'csi':
-            arr = scaling.fit_transform(filtered_data.csi.str['Total'].values.reshape(-1, 1))
+            column = category_column(filtered_data.csi, 'Total')
+            arr = scaling.fit_transform(np.array(column).reshape(-1, 1))
             temp = np.reshape(arr, arr.__len__())
             list_so_far.append(temp.tolist())
         elif choice == 'cpi':
-            arr = scaling.fit_transform(filtered_data.cpi.str['Allitems'].values.reshape(-1, 1))
+            column = category_column(filtered_data.cpi, 'Allitems')
+            arr = scaling.fit_transform(np.array(column).reshape(-1, 1))
+            temp = np.reshape(arr, arr.__len__())
+            list_so_far.append(temp.tolist())
+        elif is_numeric_column(filtered_data, choice):
+            # derived columns, such as the ones added by get_rolling_data
+            arr = scaling.fit_transform(filtered_data[choice].values.reshape(-1, 1))
             temp = np.reshape(arr, arr.__len__())
             list_so_far.append(temp.tolist())
 
     return list_so_far
 
 
+def unknown_choices(filtered_data: pd.DataFrame, usr_choice: list) -> list:
+    """Return the attribute names in usr_choice which normalize_data cannot normalize for
+    the provided filtered_data, and would therefore leave out of its result.
+
+    >>> unknown_choices(main_data, ['covid_cases', 'foo', 'csi', 'date'])
+    ['foo', 'date']
+    """
+    return [choice for choice in usr_choice
+            if choice not in {'covid_cases', 'unemployment_rate', 'csi', 'cpi'}
+            and not is_numeric_column(filtered_data, choice)]
+
+
+def is_numeric_column(filtered_data: pd.DataFrame, choice: str) -> bool:
+    """Return whether choice is a column of the provided filtered_data holding numbers,
+    such as a derived column added by get_rolling_data, which can be normalized directly.
+
+    >>> is_numeric_column(main_data, 'covid_cases'), is_numeric_column(main_data, 'baskets')
+    (True, False)
+    """
+    return choice in filtered_data.columns \
+        and pd.api.types.is_numeric_dtype(filtered_data[choice])
+
+
+def line_figure(filtered_data: pd.DataFrame, usr_choice: list[str]) -> go.Figure:
+    """Returns the line graph figure for the user's choice of data without displaying it.
+
+    This is used by line_graph and by the headless export module, which renders figures
+    without a browser.
+    """
+    fig = px.line(filtered_data, x="date", y=normalize_data(filtered_data, usr_choice),
+                  labels={"variable": "Category", "date": "Time"},
+                  title="Covid-Related Graphs")
+
+    for i in range(len(usr_choice)):
+        fig.data[i].name = usr_choice[i]
+        fig.data[i].hovertemplate = 'Category = ' \
+                                    + usr_choice[i] + '<br>date=%{x}<br>value=%{y}<extra></extra>'
+
+    return fig
+
+
 def line_graph(filtered_data: pd.DataFrame, usr_choice: list[str]) -> None:
     """Normal Line Graph plotting function that takes user's choice of data to be displayed.
 
@@ -91,16 +194,44 @@ def line_graph(filtered_data: pd.DataFrame, usr_choice: list[str]) -> None:
     >>> line_graph(filtered_data, ['covid_cases', 'unemployment_rate', 'cpi', 'csi'])
 
     """
-    fig = px.line(filtered_data, x="date", y=normalize_data(filtered_data, usr_choice),
-                  labels={"variable": "Category", "date": "Time"},
-                  title="Covid-Related Graphs")
+    line_figure(filtered_data, usr_choice).show()
 
-    for i in range(len(usr_choice)):
-        fig.data[i].name = usr_choice[i]
-        fig.data[i].hovertemplate = 'Category = ' \
-                                    + usr_choice[i] + '<br>date=%{x}<br>value=%{y}<extra></extra>'
 
-    fig.show()
+def frame_bundle() -> animation.FrameBundle:
+    """Returns the animation frames of every category in the main_data, building them the
+    first time they are needed.
+    """
+    global _FRAME_BUNDLE
+    if _FRAME_BUNDLE is None:
+        _FRAME_BUNDLE = animation.FrameBundle(
+            main_data['date'].tolist(),
+            {'covid_cases': main_data['covid_cases'].tolist(),
+             'unemployment_rate': main_data['unemployment_rate'].tolist(),
+             'csi': category_column(main_data['csi'], 'Total'),
+             'cpi': category_column(main_data['cpi'], 'Allitems')})
+
+    return _FRAME_BUNDLE
+
+
+def animated_figure(filtered_data: pd.DataFrame, usr_choice: list[str]) -> go.Figure:
+    """Returns the animated line graph figure for the user's choice of data without
+    displaying it.
+
+    The frames are sliced from the bundle precomputed for the main_data. Choices that are
+    not in the bundle, such as derived columns, are animated from a bundle built for the
+    filtered_data alone. Choices which cannot be normalized are left out of the graph.
+    """
+    unknown = unknown_choices(filtered_data, usr_choice)
+    usr_choice = [choice for choice in usr_choice if choice not in unknown]
+
+    bundle = frame_bundle()
+    if any(choice not in {'covid_cases', 'unemployment_rate', 'csi', 'cpi'}
+           for choice in usr_choice):
+        bundle = animation.FrameBundle(filtered_data['date'].tolist(),
+                                       dict(zip(usr_choice,
+                                                normalize_data(filtered_data, usr_choice))))
+
+    return bundle.figure(filtered_data['date'].min(), filtered_data['date'].max(), usr_choice)
 
 
 def animated_graph(filtered_data: pd.DataFrame, usr_choice: list[str]) -> None:
@@ -118,23 +249,26 @@ def animated_graph(filtered_data: pd.DataFrame, usr_choice: list[str]) -> None:
        # To display the line graph with all the attributes(except baskets) **
        # animated_graph(filtered_data, ['covid_cases', 'unemployment_rate', 'cpi', 'csi'])
     """
+    pio.show(animated_figure(filtered_data, usr_choice))
 
-    fig = px.scatter(filtered_data, x="date", y=normalize_data(filtered_data, usr_choice),
-                     animation_frame=[da.__str__() for da in filtered_data.date],
-                     range_x=(date(2020, 3, 1), date(2021, 10, 1)),
-                     range_y=(-0.5, 12),
-                     labels={"variable": "Category", "date": "Time"},
-                     title="Animated Covid-Related Graphs")
 
-    fig.layout.updatemenus[0].buttons[0].args[1]['frame']['duration'] = 1200
-    fig.layout.updatemenus[0].buttons[0].args[1]['transition']['duration'] = 1200
-    for i in range(len(usr_choice)):
-        fig.data[i].name = usr_choice[i]
-        fig.data[i]['marker'].update(size=14)
+def csi_bar_figure(filtered_data: pd.DataFrame) -> go.Figure:
+    """Returns the bar graph figure of the CSI categories without displaying it.
+    """
+    cat_values = [category_column(filtered_data.csi, cat) for cat in CSI_CATEGORIES]
+
+    fig = px.bar(filtered_data, x='date', y=cat_values,
+                 labels={"variable": "Category", "date": "Time",
+                         "value": "Percentage spending compared to (2002)"},
+                 title="Change in CSI Categories in Relation to Time")
+
+    for i in range(len(CSI_CATEGORIES)):
+        fig.data[i].name = CSI_CATEGORIES[i]
         fig.data[i].hovertemplate = 'Category = ' \
-                                    + usr_choice[i] + '<br>date=%{x}<br>value=%{y}<extra></extra>'
+                                    + CSI_CATEGORIES[i] \
+                                    + '<br>date=%{x}<br>value=%{y}<extra></extra>'
 
-    pio.show(fig)
+    return fig
 
 
 def csi_bar_chart(filtered_data: pd.DataFrame) -> None:
@@ -149,25 +283,122 @@ def csi_bar_chart(filtered_data: pd.DataFrame) -> None:
        >>> filtered_data = get_filtered_data(start_dt, end_dt) # apply users date filters on the data
        # csi_bar_chart(filtered_data)
     """
+    csi_bar_figure(filtered_data).show()
 
-    categories = ['Shelter', 'Food', 'Transportation',
-                  'Household operations furnishings and equipment',
-                  'Recreation education and reading', 'Health and personal care',
-                  'Alcoholic beverages tobacco products and recreational cannabis']
 
-    cat_values = [filtered_data.csi.str[cat].values.tolist() for cat in categories]
+def subcategory_figure(filtered_data: pd.DataFrame, parent: str = None,
+                       kind: str = 'bar') -> go.Figure:
+    """Returns a bar graph or treemap figure of the CSI of the sub-categories of the basket
+    parent, or of the top-level categories if parent is None.
 
-    fig = px.bar(filtered_data, x='date', y=cat_values,
-                 labels={"variable": "Category", "date": "Time",
+    The bar graph shows every month of the filtered_data, while the treemap sizes each
+    category by its average CSI over the range. Only the opened basket's sub-categories
+    are computed.
+
+    Preconditions:
+        - kind in {'bar', 'treemap'}
+        - parent is None or parent in CSI_CATEGORIES
+    """
+    if parent is None:
+        values = pd.DataFrame({cat: category_column(filtered_data.csi, cat)
+                               for cat in CSI_CATEGORIES}, index=filtered_data['date'])
+        title = "CSI Categories"
+    else:
+        values = drilldown.subcategory_csi(list(filtered_data.itertuples()), parent)
+        title = "CSI Sub-Categories of " + parent
+
+    if kind == 'treemap':
+        means = values.mean(axis=0).dropna()
+        means = means[means > 0]
+        return px.treemap(names=means.index.tolist(),
+                          parents=[parent or ''] * len(means),
+                          values=means.values.tolist(),
+                          title=title + " (average over the selected range)")
+
+    fig = px.bar(values, x=values.index, y=values.columns.tolist(),
+                 labels={"variable": "Category", "x": "Time", "index": "Time", "date": "Time",
                          "value": "Percentage spending compared to (2002)"},
-                 title="Change in CSI Categories in Relation to Time")
+                 title=title + " in Relation to Time")
+    for trace in fig.data:
+        trace.hovertemplate = 'Category = ' + trace.name \
+            + '<br>date=%{x}<br>value=%{y}<extra></extra>'
 
-    for i in range(len(categories)):
-        fig.data[i].name = categories[i]
-        fig.data[i].hovertemplate = 'Category = ' \
-                                    + categories[i] + '<br>date=%{x}<br>value=%{y}<extra></extra>'
+    return fig
+
+
+def subcategory_chart(filtered_data: pd.DataFrame, parent: str = None,
+                      kind: str = 'bar') -> None:
+    """Drill-down plotting function that displays the CSI of the sub-categories of the
+    basket parent, or of the top-level categories if parent is None.
+
+    Sample Use:
+       # NOTE: some lines are commented instead of written as doctests as otherwise
+        doctest.testmod() will cause browser windows to open with graphs
+       >>> start_dt = date(2020, 3, 1)
+       >>> end_dt = date(2021, 2, 1)
+       >>> filtered_data = get_filtered_data(start_dt, end_dt)
+       # subcategory_chart(filtered_data, 'Food')
+       # subcategory_chart(filtered_data, 'Shelter', 'treemap')
+    """
+    subcategory_figure(filtered_data, parent, kind).show()
+
+
+def correlation_figure(filtered_data: pd.DataFrame, method: str = 'pearson') -> go.Figure:
+    """Returns a heatmap figure of the correlations between every pair of series in the
+    filtered_data.
+
+    Preconditions:
+        - method in {'pearson', 'spearman'}
+    """
+    corr = analysis.correlations(list(filtered_data.itertuples()), method)
 
-    fig.show()
+    return px.imshow(corr, zmin=-1, zmax=1, color_continuous_scale='RdBu',
+                     labels={"color": method.capitalize() + " correlation"},
+                     title="Correlation Between Covid-Related Series")
+
+
+def correlation_heatmap(filtered_data: pd.DataFrame, method: str = 'pearson') -> None:
+    """Heatmap plotting function that displays the correlations between every pair of
+    series in the user's date range.
+
+    Sample Use:
+       # NOTE: some lines are commented instead of written as doctests as otherwise
+        doctest.testmod() will cause browser windows to open with graphs
+       >>> start_dt = date(2020, 3, 1)
+       >>> end_dt = date(2021, 10, 1)
+       >>> filtered_data = get_filtered_data(start_dt, end_dt)
+       # correlation_heatmap(filtered_data, 'spearman')
+    """
+    correlation_figure(filtered_data, method).show()
+
+
+def lag_figure(filtered_data: pd.DataFrame, target: str = 'covid_cases',
+               max_lag: int = 3, method: str = 'pearson') -> go.Figure:
+    """Returns a heatmap figure of the correlations between target and every other series
+    in the filtered_data, shifted by each lag from -max_lag to max_lag months.
+    """
+    lagged = analysis.lag_correlations(list(filtered_data.itertuples()), target,
+                                       max_lag, method)
+
+    return px.imshow(lagged, zmin=-1, zmax=1, color_continuous_scale='RdBu',
+                     labels={"x": "Lag (months)", "color": method.capitalize() + " correlation"},
+                     title="Lagged Correlation with " + target)
+
+
+def lag_heatmap(filtered_data: pd.DataFrame, target: str = 'covid_cases',
+                max_lag: int = 3, method: str = 'pearson') -> None:
+    """Heatmap plotting function that displays the lagged correlations between target and
+    every other series in the user's date range.
+
+    Sample Use:
+       # NOTE: some lines are commented instead of written as doctests as otherwise
+        doctest.testmod() will cause browser windows to open with graphs
+       >>> start_dt = date(2020, 3, 1)
+       >>> end_dt = date(2021, 10, 1)
+       >>> filtered_data = get_filtered_data(start_dt, end_dt)
+       # lag_heatmap(filtered_data, 'covid_cases', 4)
+    """
+    lag_figure(filtered_data, target, max_lag, method).show()
 
 
 if __name__ == '__main__':
@@ -176,8 +407,11 @@ if __name__ == '__main__':
 
     python_ta.contracts.check_all_contracts()
     python_ta.check_all(config={
-        'extra-imports': ['datetime', 'pandas', 'plotly', 'plotly.io', 'plotly.express', 'numpy',
-                          'sklearn.preprocessing', 'backend'],
+        'extra-imports': ['datetime', 'pandas', 'plotly', 'plotly.io', 'plotly.express',
+                          'plotly.graph_objects', 'numpy',
+                          'sklearn.preprocessing', 'backend', 'categories', 'analysis',
+                          'rolling', 'animation', 'drilldown',
+                          'memory'],
         'allowed-io': ['load_csv'],
         'max-line-length': 100,
         'disable': ['R1705', 'C0200']
@@ -0,0 +1,422 @@
+"""Evaluating the impact of COVID-19 on Canadians’ spending habits: memory module
+
+This module is responsible for measuring how much memory the loaded data takes up, and for
+keeping the caches of computed results under a memory ceiling by spilling the least
+recently used entries to disk.
+
+The ceiling only covers the caches of derived results (rolling statistics, correlations
+and drill-down CSI). The loaded Month objects, graph.main_data and the figures being
+displayed are always needed in memory, so they are measured by profile_stages and
+footprint_report but never spilled.
+
+Copyright and Usage Information
+===============================
+This file is Copyright (c) 2021 Rafael Gacesa.
+"""
+import os
+import pickle
+import sys
+import tempfile
+import tracemalloc
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Iterator
+import pandas as pd
+from backend import Month, load_csv, load_tables, build_months, complete_dataset
+from categories import REGISTRIES
+
+
+@dataclass
+class LegacyMonth:
+    """A month stored in the original layout, with a dictionary per month for the baskets,
+    cpi and csi, each holding its own copy of every category name.
+
+    This is only used to compare the memory used by the two layouts.
+
+        Instance Attributes:
+            - date: a date object representing the date of the data
+            - covid_cases: The number of cases recorded in the month
+            - unemployment_rate: The unemployment rate during the month
+            - baskets: A dictionary mapping names to LegacyBasket objects
+            - cpi: A dictionary containing the relative cost of specific commodities
+            - csi: A dictionary containing the 'spending index'
+    """
+    date: date
+    covid_cases: int
+    unemployment_rate: float
+    baskets: dict
+    cpi: dict
+    csi: dict
+
+
+@dataclass
+class LegacyBasket:
+    """A consumer basket stored in the original layout: a regular dataclass instance with
+    its own __dict__, holding a dictionary of its sub-categories.
+
+    This is only used to compare the memory used by the two layouts.
+
+        Instance Attributes:
+            - name: the name of the commodity
+            - weight: the weight of the basket
+            - categories: the sub-categories and their values
+    """
+    name: str
+    weight: float
+    categories: dict
+
+
+def fresh(name: str) -> str:
+    """Returns a new string object equal to name, the same way the original loader built a
+    new copy of every name for each row.
+    """
+    return ''.join([letter for letter in name])
+
+
+def legacy_month(month: Month) -> LegacyMonth:
+    """Returns a copy of month in the original dictionary-based layout.
+    """
+    baskets = {fresh(name): LegacyBasket(fresh(basket.name), basket.weight,
+                                         {fresh(sub): value
+                                          for sub, value in basket.categories.items()})
+               for name, basket in month.baskets.items()}
+    cpi = {fresh(name): value for name, value in month.cpi.items()}
+    csi = {fresh(name): value for name, value in month.csi.items()}
+    return LegacyMonth(month.date, month.covid_cases, month.unemployment_rate,
+                       baskets, cpi, csi)
+
+
+def deep_sizeof(obj: object, seen: set = None) -> int:
+    """Returns the number of bytes used by obj and every object it refers to, counting each
+    object only once.
+
+    Containers, objects with a __dict__ and objects with __slots__ are followed. Modules,
+    classes and functions are not, since they are shared by the whole program. numpy
+    objects already report the size of their data, so they are not followed either.
+    pandas objects are counted by the size of their arrays, and the values of their object
+    columns, such as the category mappings of a DataFrame of months, are followed.
+
+    >>> deep_sizeof([]) == sys.getsizeof([])
+    True
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, (type, type(sys), type(deep_sizeof))):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(index=True, deep=False)
+        size = int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+        columns = [column for _, column in obj.items()] if isinstance(obj, pd.DataFrame) \
+            else [obj]
+        return size + sum(deep_sizeof(value, seen) for column in columns
+                          if column.dtype == object for value in column)
+    elif type(obj).__module__.split('.')[0] in {'numpy', 'pandas'}:
+        return size
+    elif isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen)
+                    for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+
+    if hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), seen)
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            if hasattr(obj, slot):
+                size += deep_sizeof(getattr(obj, slot), seen)
+
+    return size
+
+
+def layout_report(data: list[Month], repeat: int = 1) -> dict[str, int]:
+    """Returns the number of bytes used by data, repeated repeat times to simulate a longer
+    history, in the compact layout and in the original dictionary-based layout.
+
+    The category registries, including the sub-category registry of every basket, are
+    shared by every month, so they are counted once as part of the compact layout, while
+    every other object is counted once per copy.
+
+    Sample usage:
+    To compare the layouts for 100 copies of the loaded history:
+    >>> from backend import load_data
+    >>> loaded_data = load_data(date(2020, 3, 1), date(2021, 10, 1), True)
+    >>> layout_report(loaded_data, 100)
+    """
+    registries = {id(registry) for registry in REGISTRIES.values()}
+    compact_size = sum(deep_sizeof(registry) for registry in REGISTRIES.values()) \
+        + repeat * deep_sizeof(tuple(data), registries)
+    legacy_size = repeat * deep_sizeof(tuple(legacy_month(month) for month in data))
+
+    return {'months': repeat * len(data),
+            'compact_bytes': compact_size,
+            'legacy_bytes': legacy_size}
+
+
+@dataclass
+class Stage:
+    """The memory used after one stage of loading and displaying the data.
+
+        Instance Attributes:
+            - name: the name of the stage
+            - traced_bytes: the memory allocated by the program after the stage, as traced
+              by tracemalloc
+            - retained_bytes: the deep size of the objects the stage produced
+    """
+    name: str
+    traced_bytes: int
+    retained_bytes: int
+
+    def __str__(self) -> str:
+        return self.name + ': ' + str(self.traced_bytes // 1024) + ' KiB allocated, ' \
+            + str(self.retained_bytes // 1024) + ' KiB retained'
+
+
+def profile_stages(start_date: date, end_date: date,
+                   build_figure: Callable[[pd.DataFrame], object] = None) -> list[Stage]:
+    """Returns the memory used after each stage of loading the data from start_date to
+    end_date, and of building a figure from it with build_figure, if it is given.
+
+    The stages are: reading the raw csv files, converting them into typed columns (after
+    which the raw rows are released), building the Month objects, predicting the missing
+    values, building the pandas DataFrame and building the figure.
+
+    Sample usage:
+    # NOTE: commented instead of written as a doctest as importing graph loads its data
+    # import graph
+    # for stage in profile_stages(date(2020, 3, 1), date(2021, 10, 1), graph.line_figure):
+    #     print(stage)
+    """
+    stages = []
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+
+    def record(name: str, retained: object) -> None:
+        stages.append(Stage(name, tracemalloc.get_traced_memory()[0], deep_sizeof(retained)))
+
+    raw = [load_csv(path, True) for path in ['covid-19_dataset.csv',
+                                             'unemployment-rate_dataset.csv',
+                                             'weighted-baskets_dataset.csv',
+                                             'consumer-price-index_dataset.csv']]
+    record('raw csv', raw)
+    del raw
+
+    tables = load_tables()
+    record('typed columns', tables)
+
+    data = build_months(tables, start_date, end_date)
+    del tables
+    record('months', data)
+
+    complete_dataset(data)
+    record('predicted months', data)
+
+    frame = pd.DataFrame(data)
+    record('dataframe', frame)
+
+    if build_figure is not None:
+        fig = build_figure(frame)
+        record('figure', fig)
+
+    if not was_tracing:
+        tracemalloc.stop()
+    return stages
+
+
+def footprint_report(objects: dict[str, object]) -> dict[str, int]:
+    """Returns the deep size of every named object in objects, counting the objects they
+    share only once, in the first one they are found in.
+
+    Sample usage:
+    # NOTE: commented instead of written as a doctest as importing graph loads its data
+    # import graph
+    # footprint_report({'main_data': graph.main_data, 'caches': spill_caches()})
+    """
+    seen = set()
+    return {name: deep_sizeof(obj, seen) for name, obj in objects.items()}
+
+
+# The maximum number of bytes the spill caches may hold in memory, or None for no limit.
+# This does not include the loaded data itself, which is never spilled.
+MEMORY_CEILING = None
+
+# The directory the spilled cache entries are written to
+SNAPSHOT_DIR = os.path.join(tempfile.gettempdir(), 'covid-19-trends-snapshot')
+
+# Every spill cache created, which share the memory ceiling
+_SPILL_CACHES = []
+
+# A counter ordering every access to a spill cache, used to find the least recently used
+_CLOCK = [0]
+
+
+class SpillCache(MutableMapping):
+    """A cache of computed results which shares the memory ceiling with every other spill
+    cache.
+
+    When the entries held in memory by all spill caches exceed MEMORY_CEILING, the least
+    recently used entries are pickled to a snapshot file in SNAPSHOT_DIR and dropped from
+    memory. They are transparently loaded back the next time they are used. Only results
+    stored in a spill cache count towards the ceiling.
+
+    >>> cache = SpillCache('example')
+    >>> cache['a'] = [1, 2, 3]
+    >>> cache['a']
+    [1, 2, 3]
+    """
+    # Private Instance Attributes:
+    #     - _name: the name of the cache, used in the names of its snapshot files
+    #     - _entries: the entries held in memory, from least to most recently used
+    #     - _sizes: the deep size of each entry held in memory
+    #     - _used: the clock value of the last access to each entry held in memory
+    #     - _spilled: the path of the snapshot file of each spilled entry
+    _name: str
+    _entries: OrderedDict
+    _sizes: dict
+    _used: dict
+    _spilled: dict
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._used = {}
+        self._spilled = {}
+        _SPILL_CACHES.append(self)
+
+    def __getitem__(self, key: object) -> object:
+        if key in self._spilled:
+            path = self._spilled.pop(key)
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+            os.remove(path)
+            self[key] = value
+
+        value = self._entries[key]
+        self._entries.move_to_end(key)
+        self._used[key] = tick()
+        return value
+
+    def __setitem__(self, key: object, value: object) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._sizes[key] = deep_sizeof(value)
+        self._used[key] = tick()
+        enforce_ceiling()
+
+    def __delitem__(self, key: object) -> None:
+        if key in self._spilled:
+            os.remove(self._spilled.pop(key))
+        else:
+            del self._entries[key]
+            del self._sizes[key]
+            del self._used[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries or key in self._spilled
+
+    def __iter__(self) -> Iterator:
+        return iter(list(self._entries) + list(self._spilled))
+
+    def __len__(self) -> int:
+        return len(self._entries) + len(self._spilled)
+
+    def resident_bytes(self) -> int:
+        """Returns the number of bytes used by the entries held in memory."""
+        return sum(self._sizes.values())
+
+    def resident_count(self) -> int:
+        """Returns the number of entries held in memory."""
+        return len(self._entries)
+
+    def oldest_use(self) -> int:
+        """Returns the clock value of the least recently used entry held in memory, or None
+        if there are no entries in memory."""
+        if not self._entries:
+            return None
+        return self._used[next(iter(self._entries))]
+
+    def spill_oldest(self) -> None:
+        """Writes the least recently used entry held in memory to a snapshot file and drops
+        it from memory.
+
+        Preconditions:
+            - self.oldest_use() is not None
+        """
+        key, value = self._entries.popitem(last=False)
+        del self._sizes[key]
+        del self._used[key]
+
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix=self._name + '-', suffix='.pkl', dir=SNAPSHOT_DIR)
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump(value, file)
+        self._spilled[key] = path
+
+
+def tick() -> int:
+    """Returns the next value of the clock ordering the accesses to the spill caches."""
+    _CLOCK[0] += 1
+    return _CLOCK[0]
+
+
+def spill_caches() -> list[SpillCache]:
+    """Returns every spill cache created so far."""
+    return list(_SPILL_CACHES)
+
+
+def set_memory_ceiling(ceiling: int = None, snapshot_dir: str = None) -> None:
+    """Sets the maximum number of bytes the spill caches may hold in memory, and optionally
+    the directory spilled entries are written to, then spills entries until the caches are
+    under the new ceiling. A ceiling of None removes the limit.
+
+    The ceiling only limits the derived results held by the spill caches, not the loaded
+    data (the Month objects and graph.main_data) or the figures built from it.
+    """
+    global MEMORY_CEILING, SNAPSHOT_DIR
+    MEMORY_CEILING = ceiling
+    if snapshot_dir is not None:
+        SNAPSHOT_DIR = snapshot_dir
+    enforce_ceiling()
+
+
+def enforce_ceiling() -> None:
+    """Spills the least recently used entries of all spill caches until the entries held
+    in memory fit under MEMORY_CEILING.
+
+    The most recently used entry is always kept in memory, even if it alone is over the
+    ceiling.
+    """
+    if MEMORY_CEILING is None:
+        return
+
+    while sum(cache.resident_bytes() for cache in _SPILL_CACHES) > MEMORY_CEILING:
+        candidates = [cache for cache in _SPILL_CACHES if cache.oldest_use() is not None]
+        if sum(cache.resident_count() for cache in candidates) <= 1:
+            return
+        min(candidates, key=lambda cache: cache.oldest_use()).spill_oldest()
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['os', 'pickle', 'sys', 'tempfile', 'tracemalloc', 'collections',
+                          'collections.abc', 'dataclasses', 'datetime', 'typing', 'pandas',
+                          'backend', 'categories'],
+        'allowed-io': ['SpillCache.__getitem__', 'SpillCache.spill_oldest'],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import doctest
+
+    doctest.testmod()
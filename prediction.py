@@ -8,42 +8,194 @@ Copyright and Usage Information
 ===============================
 This file is Copyright (c) 2021 Rafael Gacesa.
 """
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sklearn.model_selection import train_test_split, KFold, TimeSeriesSplit
+from sklearn.linear_model import LinearRegression, Ridge
+
+# The candidate models that can be fitted by a Predictor
+MODELS = ['linear', 'ridge', 'lagged']
+
+# The best model found for each category and the cross-validated error of every model,
+# keyed by the category and the data they were evaluated on
+_BEST_MODELS = {}
 
 
 class Predictor:
     """A class representing prediction objects which can make predictions
         based on linear regression models on provided data.
+
+    The model is one of MODELS: 'linear' and 'ridge' predict from the case count alone,
+    while 'lagged' also uses the case count of the previous month.
         """
     # Private Instance Attributes:
-    #     - _predictor: the sklearn LinearRegression object
+    #     - _predictor: the sklearn regression object
     #     - _cases: list of case count data (with number of features)
     #     - _csi: list of csi data corresponding with case counts
+    #     - _model: the name of the model used
+    #     - _fit_all: whether the model is fitted on all of the data, rather than on a
+    #                 random 75% of it
     _predictor: LinearRegression
     _cases: list[list]
     _csi: list[float]
+    _model: str
+    _fit_all: bool
 
-    def __init__(self, cases: list, csi: list) -> None:
+    def __init__(self, cases: list, csi: list, model: str = 'linear',
+                 previous_cases: list = None, fit_all: bool = False) -> None:
         """Initialize this predictor with the given data, add number of features
         to case data (1 feature for each case value), and generate the
-        LinearRegression object using the generator method."""
-        self._cases = [[case, 1] for case in cases]
+        regression object using the generator method.
+
+        previous_cases holds the case count of the month before each of cases, and is
+        only used by the 'lagged' model. It defaults to cases itself. With fit_all, the
+        model is fitted on every month, as when it was chosen by select_models, whose
+        cross-validation already measured its error on held-out months.
+
+        Preconditions:
+            - model in MODELS
+            - previous_cases is None or len(previous_cases) == len(cases)
+        """
+        self._model = model
+        self._cases = features(model, cases, previous_cases)
         self._csi = csi
+        self._fit_all = fit_all
         self._predictor = self.generate_predictor()
 
     def generate_predictor(self) -> LinearRegression:
-        """Use sklearn LinearRegression objects and data formatting methods to create
+        """Use sklearn regression objects and data formatting methods to create
         a linear regression prediction object."""
-        cases_train, _, csi_train, _ = train_test_split(self._cases, self._csi, random_state=0)
-        predictor = LinearRegression()
+        if self._fit_all:
+            cases_train, csi_train = self._cases, self._csi
+        else:
+            cases_train, _, csi_train, _ = train_test_split(self._cases, self._csi,
+                                                            random_state=0)
+        predictor = new_model(self._model)
         predictor.fit(cases_train, csi_train)
         return predictor
 
-    def make_prediction(self, case_count: int) -> float:
-        """Use the LinearRegression object to create a prediction based
-        on a given case count."""
-        return self._predictor.predict([[case_count, 1]])[0]
+    def make_prediction(self, case_count: int, previous_count: int = None) -> float:
+        """Use the regression object to create a prediction based
+        on a given case count, and the previous month's case count for the 'lagged' model."""
+        return self._predictor.predict(features(self._model, [case_count],
+                                                None if previous_count is None
+                                                else [previous_count]))[0]
+
+
+def new_model(model: str) -> LinearRegression:
+    """Returns a new, unfitted sklearn regression object for the given model.
+    """
+    if model == 'ridge':
+        return Ridge()
+    else:
+        return LinearRegression()
+
+
+def features(model: str, cases: list, previous_cases: list = None) -> list[list]:
+    """Returns the feature rows used by model for the given case counts.
+
+    >>> features('linear', [10, 20])
+    [[10, 1], [20, 1]]
+    >>> features('lagged', [10, 20], [5, 10])
+    [[10, 5, 1], [20, 10, 1]]
+    """
+    if model == 'lagged':
+        if previous_cases is None:
+            previous_cases = cases
+        return [[cases[i], previous_cases[i], 1] for i in range(len(cases))]
+    else:
+        return [[case, 1] for case in cases]
+
+
+def fold_errors(model: str, x: np.ndarray, y: np.ndarray, train: np.ndarray,
+                test: np.ndarray) -> np.ndarray:
+    """Returns the errors of model on the test rows of x and y after fitting it to the train
+    rows. This runs inside the worker processes of evaluate_models.
+    """
+    predictor = new_model(model)
+    predictor.fit(x[train], y[train])
+    return predictor.predict(x[test]) - y[test]
+
+
+def evaluate_models(cases: list, csi: dict, previous_cases: list = None, folds: int = 5,
+                    time_series: bool = True, max_workers: int = None) -> dict:
+    """Returns the cross-validated error of every model in MODELS for every category in csi,
+    as a nested dictionary mapping category, then model, to a dictionary containing its
+    'mae' (mean absolute error) and 'rmse' (root mean squared error).
+
+    csi maps each category to its values, one for each of cases. With time_series, each
+    fold is tested on the months after the ones it was trained on, otherwise the months
+    are split into folds at random. Every fold of every model and category is fitted in
+    parallel on a pool of worker processes.
+
+    Preconditions:
+        - folds >= 2
+        - all(len(csi[category]) == len(cases) for category in csi)
+        - len(cases) > folds
+
+    Sample usage:
+    >>> errors = evaluate_models([1, 2, 3, 4, 5, 6, 7], {'Total': [2, 4, 6, 8, 10, 12, 14]},
+    ...                          folds=3, max_workers=1)
+    >>> errors['Total']['linear']['mae'] < 1e-6
+    True
+    """
+    splitter = TimeSeriesSplit(folds) if time_series else KFold(folds, shuffle=True,
+                                                                 random_state=0)
+    splits = list(splitter.split(cases))
+    tasks = [(category, model, train, test) for category in csi for model in MODELS
+             for train, test in splits]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fold_errors, model,
+                                   np.array(features(model, cases, previous_cases), dtype=float),
+                                   np.array(csi[category], dtype=float), train, test)
+                   for category, model, train, test in tasks]
+        results = [future.result() for future in futures]
+
+    errors = {category: {model: [] for model in MODELS} for category in csi}
+    for i in range(len(tasks)):
+        errors[tasks[i][0]][tasks[i][1]].append(results[i])
+
+    return {category: {model: {'mae': float(np.mean(np.abs(np.concatenate(error)))),
+                               'rmse': float(np.sqrt(np.mean(np.concatenate(error) ** 2)))}
+                       for model, error in errors[category].items()}
+            for category in errors}
+
+
+def select_models(cases: list, csi: dict, previous_cases: list = None, folds: int = 5,
+                  max_workers: int = None, errors: dict = None) -> dict[str, str]:
+    """Returns a dictionary mapping every category in csi to the model in MODELS with the
+    lowest cross-validated mean absolute error.
+
+    If errors is given, it is updated with the cross-validated error of every model for
+    every category, in the format returned by evaluate_models. The choice and the errors
+    are cached for each category and data, so the models are only evaluated for
+    categories whose data has not been seen before.
+
+    Cross-validation needs at least 3 months, so with fewer the 'linear' model is chosen
+    for every category and errors is left unchanged.
+
+    >>> select_models([1, 2], {'Total': [2, 4]})
+    {'Total': 'linear'}
+    """
+    if len(cases) < 3:
+        return {category: 'linear' for category in csi}
+
+    keys = {category: (category, tuple(cases), tuple(csi[category]),
+                       None if previous_cases is None else tuple(previous_cases), folds)
+            for category in csi}
+    missing = {category: csi[category] for category in csi if keys[category] not in _BEST_MODELS}
+
+    if missing:
+        new_errors = evaluate_models(cases, missing, previous_cases,
+                                     min(folds, len(cases) - 1), max_workers=max_workers)
+        for category in missing:
+            best = min(MODELS, key=lambda m: new_errors[category][m]['mae'])
+            _BEST_MODELS[keys[category]] = (best, new_errors[category])
+
+    if errors is not None:
+        errors.update({category: _BEST_MODELS[keys[category]][1] for category in csi})
+    return {category: _BEST_MODELS[keys[category]][0] for category in csi}
 
 
 if __name__ == '__main__':
@@ -52,7 +204,8 @@ if __name__ == '__main__':
 
     python_ta.contracts.check_all_contracts()
     python_ta.check_all(config={
-        'extra-imports': ['sklearn.model_selection', 'sklearn.linear_model'],
+        'extra-imports': ['concurrent.futures', 'numpy', 'sklearn.model_selection',
+                          'sklearn.linear_model'],
         'allowed-io': [],
         'max-line-length': 100,
         'disable': ['R1705', 'C0200']
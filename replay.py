@@ -0,0 +1,163 @@
+"""Evaluating the impact of COVID-19 on Canadians’ spending habits: replay module
+
+This module is responsible for replaying a scripted sequence of mouse events through the
+pygame visualization without a window, and measuring how long each frame, each drawing
+function and each graph takes, as a repeatable benchmark of the interface.
+
+Copyright and Usage Information
+===============================
+This file is Copyright (c) 2021 Raiyan Raad.
+"""
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Callable
+
+# SDL has to be told to use its dummy video driver before visualization opens its window
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame  # pylint: disable=wrong-import-position
+import visualization  # pylint: disable=wrong-import-position
+
+# The functions of visualization whose time is measured, including dispatch_graph
+PROFILED_FUNCTIONS = ['draw_page', 'page_one_buttons', 'draw_option_gui', 'theme_selector',
+                      'draw_submit_animate', 'page_three_buttons', 'mouse_click',
+                      'dispatch_graph']
+
+# A script which visits every page, toggles every category and builds every graph
+DEFAULT_SCRIPT = [('hover', (300, 150)), ('click', (40, 48)), ('hover', (45, 145)),
+                  ('click', (90, 190)), ('click', (40, 48)), ('hover', (300, 300)),
+                  ('click', (300, 300)), ('hover', (60, 450)), ('click', (60, 450)),
+                  ('click', (300, 150)), ('click', (100, 85)), ('click', (100, 325)),
+                  ('hover', (300, 420)), ('click', (300, 420)), ('click', (100, 165)),
+                  ('click', (100, 245)), ('hover', (500, 420)), ('click', (500, 420)),
+                  ('click', (100, 400))]
+
+
+@dataclass
+class ReplayReport:
+    """The timings measured while replaying a script.
+
+        Instance Attributes:
+            - frame_times: the time taken by each frame, in seconds
+            - function_times: a dictionary mapping the name of every profiled function to
+              the time taken by each of its calls, in seconds
+    """
+    frame_times: list[float] = field(default_factory=list)
+    function_times: dict[str, list[float]] = field(default_factory=dict)
+
+    def frame_percentiles(self) -> dict[str, float]:
+        """Returns the 50th, 90th and 99th percentile and maximum frame time, in
+        milliseconds."""
+        return {'p50': percentile(self.frame_times, 50) * 1000,
+                'p90': percentile(self.frame_times, 90) * 1000,
+                'p99': percentile(self.frame_times, 99) * 1000,
+                'max': max(self.frame_times, default=0.0) * 1000}
+
+    def dispatch_latencies(self) -> list[float]:
+        """Returns the time taken to build each graph that was dispatched, in
+        milliseconds."""
+        return [t * 1000 for t in self.function_times.get('dispatch_graph', [])]
+
+    def __str__(self) -> str:
+        lines = [str(len(self.frame_times)) + ' frames: '
+                 + ', '.join(name + ' ' + format(value, '.3f') + ' ms'
+                             for name, value in self.frame_percentiles().items())]
+        for name, times in self.function_times.items():
+            if times:
+                lines.append(name + ': ' + str(len(times)) + ' calls, '
+                             + format(sum(times) * 1000, '.3f') + ' ms total')
+        return '\n'.join(lines)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Returns the p-th percentile of values, using the nearest-rank method, or 0.0 if
+    values is empty.
+
+    >>> percentile([4.0, 1.0, 3.0, 2.0], 50)
+    2.0
+    >>> percentile([4.0, 1.0, 3.0, 2.0], 99)
+    4.0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -int(-p * len(ordered) // 100))
+    return ordered[rank - 1]
+
+
+def timed(function: Callable, times: list[float]) -> Callable:
+    """Returns a wrapper around function which appends the time taken by each call to
+    times, in seconds."""
+    def wrapper(*args: object) -> object:
+        start = time.perf_counter()
+        result = function(*args)
+        times.append(time.perf_counter() - start)
+        return result
+
+    return wrapper
+
+
+def replay(start_date: date, end_date: date, script: list[tuple[str, tuple[int, int]]],
+           repeat: int = 1) -> ReplayReport:
+    """Replays script repeat times through the visualization and returns the timings.
+
+    Each step of script is a ('hover', position) or ('click', position) pair, and is
+    played as one frame: a click is handled as in show_visual, then the current page is
+    drawn for that mouse position. Every repetition starts on the first page with no
+    categories selected. Frames are not limited to 60 per second, and graphs are built
+    but not opened in the browser.
+
+    Sample usage:
+    # NOTE: commented instead of written as a doctest as importing graph loads its data
+    # report = replay(date(2020, 3, 1), date(2021, 10, 1), DEFAULT_SCRIPT, 10)
+    # print(report)
+    """
+    report = ReplayReport([], {name: [] for name in PROFILED_FUNCTIONS})
+    originals = {name: getattr(visualization, name) for name in PROFILED_FUNCTIONS}
+    show_graphs = visualization.SHOW_GRAPHS
+
+    for name in PROFILED_FUNCTIONS:
+        setattr(visualization, name, timed(originals[name], report.function_times[name]))
+    visualization.SHOW_GRAPHS = False
+    visualization.set_date_range(start_date, end_date)
+
+    try:
+        for _ in range(repeat):
+            # every repetition starts from the same state, so each replays the same workload
+            page, theme_number, option_gui, categories = 0, 0, False, []
+            for kind, pos in script:
+                start = time.perf_counter()
+                pygame.event.pump()
+                if kind == 'click':
+                    pos, page, option_gui, theme_number, categories = \
+                        visualization.mouse_click(pos, page, option_gui, theme_number,
+                                                  categories)
+                visualization.draw_page(pos, page, option_gui, theme_number, categories)
+                pygame.display.flip()
+                report.frame_times.append(time.perf_counter() - start)
+    finally:
+        for name in PROFILED_FUNCTIONS:
+            setattr(visualization, name, originals[name])
+        visualization.SHOW_GRAPHS = show_graphs
+
+    return report
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['os', 'time', 'dataclasses', 'datetime', 'typing', 'pygame',
+                          'visualization'],
+        'generated-members': ['pygame.*'],
+        'allowed-io': []
+    })
+
+    import doctest
+
+    doctest.testmod()
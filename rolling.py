@@ -0,0 +1,247 @@
+"""Evaluating the impact of COVID-19 on Canadians’ spending habits: rolling module
+
+This module is responsible for computing rolling (windowed) statistics over the loaded
+series, which are added to the data as derived columns that can be graphed.
+
+Every statistic is updated incrementally in O(1) time per step, using prefix sums or
+monotonic deques, so the cost does not grow with the window size. Missing (nan) values,
+such as months a dataset does not cover, are skipped: each window's statistic is computed
+from the values it does have, and a missing value stops affecting the result as soon as
+it leaves the window.
+
+Copyright and Usage Information
+===============================
+This file is Copyright (c) 2021 Rafael Gacesa.
+"""
+from collections import deque
+import numpy as np
+import pandas as pd
+from categories import category_column
+
+# The statistics that can be computed by add_rolling_columns
+STATISTICS = ['mean', 'var', 'min', 'max', 'pct_change']
+
+
+def window_sums(values: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the sum of the non-nan values in each full window of values, and the number
+    of those values, for the windows ending at index window - 1 onwards.
+
+    Both are taken as differences of prefix sums, which are built with every nan replaced
+    by 0, so a nan only affects the windows that contain it.
+
+    Preconditions:
+        - window >= 1
+
+    >>> totals, counts = window_sums(np.array([1.0, np.nan, 3.0]), 2)
+    >>> totals.tolist(), counts.tolist()
+    ([1.0, 3.0], [1, 1])
+    """
+    valid = ~np.isnan(values)
+    zeros = np.zeros((1,) + values.shape[1:])
+    prefix = np.concatenate([zeros, np.cumsum(np.where(valid, values, 0.0), axis=0)])
+    counts = np.concatenate([zeros.astype(int), np.cumsum(valid, axis=0)])
+    return prefix[window:] - prefix[:-window], counts[window:] - counts[:-window]
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Returns the mean of each window of values ending at every index, using prefix sums.
+
+    The first window - 1 values have no full window and are nan. The mean of each window
+    is taken over its non-nan values, and is nan if it has none. values may be 2D, in
+    which case every column is treated as a separate series.
+
+    Preconditions:
+        - window >= 1
+
+    >>> rolling_mean(np.array([1.0, 2.0, 3.0, 4.0]), 2).tolist()
+    [nan, 1.5, 2.5, 3.5]
+    >>> rolling_mean(np.array([1.0, np.nan, 3.0, 4.0, 5.0, 6.0]), 2).tolist()
+    [nan, 1.0, 3.0, 3.5, 4.5, 5.5]
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.full(values.shape, np.nan)
+    if len(values) < window:
+        return result
+
+    total, count = window_sums(values, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[window - 1:] = np.where(count > 0, total / count, np.nan)
+    return result
+
+
+def rolling_var(values: np.ndarray, window: int) -> np.ndarray:
+    """Returns the sample variance of each window of values ending at every index, using
+    prefix sums of the values and of their squares.
+
+    The values are shifted by their first non-nan value before summing, which keeps the
+    sums small and avoids losing precision when the values are large and vary little.
+    The variance of each window is taken over its non-nan values, and is nan if it has
+    fewer than two.
+
+    Preconditions:
+        - window >= 2
+
+    >>> rolling_var(np.array([1.0, 2.0, 4.0]), 2).tolist()
+    [nan, 0.5, 2.0]
+    >>> rolling_var(np.array([1.0, np.nan, 2.0, 4.0]), 2).tolist()
+    [nan, nan, nan, 2.0]
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.full(values.shape, np.nan)
+    if len(values) < window:
+        return result
+
+    first = np.argmax(~np.isnan(values), axis=0)
+    shift = np.take_along_axis(values, first[np.newaxis], axis=0)[0]
+    shifted = values - np.nan_to_num(shift)
+
+    total, count = window_sums(shifted, window)
+    total_sq, _ = window_sums(shifted ** 2, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = np.maximum(total_sq - total ** 2 / count, 0.0) / (count - 1)
+    result[window - 1:] = np.where(count >= 2, variance, np.nan)
+    return result
+
+
+def rolling_extreme(values: np.ndarray, window: int, maximum: bool) -> np.ndarray:
+    """Returns the minimum (or maximum, if maximum is True) of each window of the 1D values
+    ending at every index.
+
+    A deque holds the indices of the values that can still become the extreme of a later
+    window, in monotonic order, so every index is added and removed at most once. Nan
+    values are never added, so the extreme of each window is taken over its non-nan
+    values, and is nan if it has none.
+
+    Preconditions:
+        - window >= 1
+        - values.ndim == 1
+
+    >>> rolling_extreme(np.array([3.0, 1.0, 2.0, 5.0]), 2, False).tolist()
+    [nan, 1.0, 1.0, 2.0]
+    >>> rolling_extreme(np.array([1.0, np.nan, 3.0, 4.0]), 2, True).tolist()
+    [nan, 1.0, 3.0, 4.0]
+    """
+    values = np.asarray(values, dtype=float)
+    sign = -1.0 if maximum else 1.0
+    candidates = deque()
+    result = np.full(values.shape, np.nan)
+
+    for i in range(len(values)):
+        if not np.isnan(values[i]):
+            while candidates and sign * values[candidates[-1]] >= sign * values[i]:
+                candidates.pop()
+            candidates.append(i)
+        while candidates and candidates[0] <= i - window:
+            candidates.popleft()
+        if i >= window - 1 and candidates:
+            result[i] = values[candidates[0]]
+
+    return result
+
+
+def rolling_pct_change(values: np.ndarray, window: int) -> np.ndarray:
+    """Returns the percent change of values over each window, from the value window
+    indices earlier to the value at every index.
+
+    Preconditions:
+        - window >= 1
+
+    >>> rolling_pct_change(np.array([2.0, 3.0, 4.0]), 1).tolist()
+    [nan, 50.0, 33.33333333333333]
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.full(values.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[window:] = (values[window:] - values[:-window]) / values[:-window] * 100.0
+    return result
+
+
+def compute_statistic(values: np.ndarray, window: int, statistic: str) -> np.ndarray:
+    """Returns the given rolling statistic of the 1D values.
+
+    Preconditions:
+        - statistic in STATISTICS
+    """
+    if statistic == 'mean':
+        return rolling_mean(values, window)
+    elif statistic == 'var':
+        return rolling_var(values, window)
+    elif statistic == 'min':
+        return rolling_extreme(values, window, False)
+    elif statistic == 'max':
+        return rolling_extreme(values, window, True)
+    else:
+        return rolling_pct_change(values, window)
+
+
+def series_columns(data: pd.DataFrame) -> dict:
+    """Returns a dictionary mapping the name of every series in data to its values.
+
+    The series are the covid cases, the unemployment rate and each CSI category, which is
+    named 'csi: <category>'.
+    """
+    series = {'covid_cases': data['covid_cases'].to_numpy(dtype=float),
+              'unemployment_rate': data['unemployment_rate'].to_numpy(dtype=float)}
+
+    categories = sorted({name for csi in data['csi'] for name in csi})
+    for category in categories:
+        series['csi: ' + category] = np.array(category_column(data['csi'], category))
+
+    return series
+
+
+def rolling_column_name(series: str, statistic: str, window: int) -> str:
+    """Returns the name of the derived column holding a rolling statistic of series.
+
+    >>> rolling_column_name('covid_cases', 'mean', 3)
+    'covid_cases mean 3'
+    """
+    return series + ' ' + statistic + ' ' + str(window)
+
+
+def add_rolling_columns(data: pd.DataFrame, window: int,
+                        statistics: list[str] = None) -> pd.DataFrame:
+    """Returns a copy of data with a derived column for each rolling statistic of every
+    series, named by rolling_column_name.
+
+    By default every statistic in STATISTICS is added. The derived columns can be passed
+    to graph.normalize_data and graph.line_graph like any other attribute.
+
+    Preconditions:
+        - window >= 2
+        - all(statistic in STATISTICS for statistic in statistics)
+
+    Sample usage:
+    >>> from datetime import date
+    >>> from backend import load_data
+    >>> loaded_data = pd.DataFrame(load_data(date(2020, 3, 1), date(2021, 10, 1), True))
+    >>> rolling_data = add_rolling_columns(loaded_data, 3, ['mean', 'max'])
+    >>> rolling_data['covid_cases mean 3']
+    """
+    if statistics is None:
+        statistics = STATISTICS
+
+    derived = {rolling_column_name(name, statistic, window):
+               compute_statistic(values, window, statistic)
+               for name, values in series_columns(data).items()
+               for statistic in statistics}
+
+    return pd.concat([data, pd.DataFrame(derived, index=data.index)], axis=1)
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['collections', 'numpy', 'pandas', 'categories', 'datetime',
+                          'backend'],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import doctest
+
+    doctest.testmod()
@@ -0,0 +1,259 @@
+"""Evaluating the impact of COVID-19 on Canadians’ spending habits: schema module
+
+This module is responsible for describing the columns used from each dataset, validating
+them against the dataset headers, and converting the raw csv rows into typed arrays.
+
+Rows which cannot be converted are quarantined and reported instead of aborting the load.
+
+Copyright and Usage Information
+===============================
+This file is Copyright (c) 2021 Rafael Gacesa.
+"""
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+
+
+class SchemaError(Exception):
+    """Exception raised when a dataset's header does not match its schema."""
+
+
+@dataclass
+class Column:
+    """A column used from a dataset.
+
+        Instance Attributes:
+            - header: the expected header of the column, or None if it is not checked
+            - position: the index of the column in each row
+            - dtype: the type the column is converted to
+
+        Representation Invariants:
+            - self.position >= 0
+            - self.dtype in {'int', 'float', 'str', 'month'}
+    """
+    header: Optional[str]
+    position: int
+    dtype: str
+
+
+@dataclass
+class Schema:
+    """The columns used from a dataset, keyed by the name they are accessed with.
+
+        Instance Attributes:
+            - dataset: the name of the dataset
+            - columns: the columns used from the dataset
+
+        Representation Invariants:
+            - self.columns != {}
+    """
+    dataset: str
+    columns: dict[str, Column]
+
+    def width(self) -> int:
+        """Returns the minimum number of values a row needs to contain every column."""
+        return max(column.position for column in self.columns.values()) + 1
+
+
+@dataclass
+class QuarantinedRow:
+    """A row which was left out of a dataset because it could not be converted.
+
+        Instance Attributes:
+            - dataset: the name of the dataset
+            - line: the line number of the row in the csv file, counting the header as 1
+            - reason: a description of the problem with the row
+    """
+    dataset: str
+    line: int
+    reason: str
+
+    def __str__(self) -> str:
+        return self.dataset + ', line ' + str(self.line) + ': ' + self.reason
+
+
+COVID_SCHEMA = Schema('covid-19', {
+    'province': Column('pruid', 0, 'int'),
+    'month': Column('date', 3, 'month'),
+    'cases': Column('numtoday', 15, 'int')
+})
+
+UNEMPLOYMENT_SCHEMA = Schema('unemployment-rate', {
+    'month': Column('DATE', 0, 'month'),
+    'rate': Column(None, 1, 'float')
+})
+
+BASKETS_SCHEMA = Schema('weighted-baskets', {
+    'month': Column('REF_DATE', 0, 'month'),
+    'name': Column(None, 3, 'str'),
+    'coordinate': Column('COORDINATE', 9, 'str'),
+    'value': Column('VALUE', 10, 'float')
+})
+
+CPI_SCHEMA = Schema('consumer-price-index', {
+    'month': Column('REF_DATE', 0, 'month'),
+    'region': Column('GEO', 1, 'str'),
+    'name': Column(None, 3, 'str'),
+    'value': Column('VALUE', 10, 'float')
+})
+
+
+def clean_header(header: str) -> str:
+    """Returns header without surrounding whitespace, quotes or byte order mark, in
+    lowercase.
+
+    >>> clean_header('\\ufeff"REF_DATE"')
+    'ref_date'
+    """
+    return header.strip().lstrip('\ufeff').strip('"').lower()
+
+
+def validate_header(schema: Schema, header: list[str]) -> None:
+    """Raises a SchemaError if header is missing any column of schema, or has a different
+    name at a checked position.
+
+    >>> validate_header(UNEMPLOYMENT_SCHEMA, ['DATE', 'LRUNTTTTCAM156S'])
+    >>> validate_header(UNEMPLOYMENT_SCHEMA, ['VALUE', 'DATE'])  # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ...
+    schema.SchemaError: unemployment-rate: expected column 0 to be 'DATE', found 'VALUE'
+    """
+    if len(header) < schema.width():
+        raise SchemaError(schema.dataset + ': expected at least ' + str(schema.width())
+                          + ' columns, found ' + str(len(header)))
+
+    for column in schema.columns.values():
+        found = header[column.position]
+        if column.header is not None and clean_header(found) != clean_header(column.header):
+            raise SchemaError(schema.dataset + ': expected column ' + str(column.position)
+                              + ' to be ' + repr(column.header) + ', found ' + repr(found))
+
+
+def convert_value(value: str, dtype: str) -> object:
+    """Returns value converted to dtype, raising a ValueError or OverflowError if it is not
+    valid.
+
+    The value is converted by convert_column, so a value is accepted here exactly when it
+    would be accepted as part of a column.
+    """
+    return convert_column([value], dtype)[0]
+
+
+def convert_column(values: list[str], dtype: str) -> np.ndarray:
+    """Returns values converted to a typed array of dtype, in a single vectorized
+    conversion.
+
+    Raises a ValueError if any of the values is not valid, or an OverflowError if an int
+    does not fit in 64 bits. Months are given as 'YYYY-MM' or 'YYYY-MM-DD' strings, and
+    converted to datetime64 months; anything else, including blank values, is invalid
+    rather than converted to NaT.
+
+    >>> convert_column(['2020-03-14', '2021-10'], 'month').tolist()
+    [datetime.date(2020, 3, 1), datetime.date(2021, 10, 1)]
+    >>> convert_column(['2020'], 'month')
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid month: '2020'
+    """
+    strings = np.array(values, dtype=str)
+
+    if dtype == 'int':
+        return strings.astype(np.int64)
+    elif dtype == 'float':
+        return strings.astype(np.float64)
+    elif dtype == 'month':
+        return convert_months(strings)
+    else:
+        return strings
+
+
+def convert_months(strings: np.ndarray) -> np.ndarray:
+    """Returns the 'YYYY-MM' or 'YYYY-MM-DD' strings converted to datetime64 months,
+    raising a ValueError if any of them does not start with a valid 'YYYY-MM' month.
+    """
+    months = strings.astype('U7')
+    shaped = (np.char.str_len(months) == 7) & (np.char.find(months, '-') == 4) \
+        & (np.char.count(months, '-') == 1) \
+        & np.char.isdigit(np.char.replace(months, '-', '')) \
+        & ((np.char.str_len(strings) == 7) | (np.char.find(strings, '-', 7) == 7))
+    if not shaped.all():
+        raise ValueError('invalid month: ' + repr(str(strings[np.argmin(shaped)])))
+
+    result = months.astype('datetime64[M]')
+    if np.isnat(result).any():
+        raise ValueError('invalid month: ' + repr(str(strings[np.argmax(np.isnat(result))])))
+    return result
+
+
+def invalid_rows(schema: Schema, rows: list[list[str]]) -> dict[int, str]:
+    """Returns a dictionary mapping the index of every row in rows which can not be
+    converted to the reason why.
+
+    This checks each value individually, so it is only used once a vectorized conversion
+    has failed.
+    """
+    invalid = {}
+
+    for i in range(len(rows)):
+        if len(rows[i]) < schema.width():
+            invalid[i] = 'expected at least ' + str(schema.width()) + ' values, found ' \
+                + str(len(rows[i]))
+            continue
+
+        for name, column in schema.columns.items():
+            try:
+                convert_value(rows[i][column.position], column.dtype)
+            except (ValueError, OverflowError):
+                invalid[i] = 'invalid ' + column.dtype + ' for ' + name + ': ' \
+                    + repr(rows[i][column.position])
+                break
+
+    return invalid
+
+
+def parse_rows(schema: Schema, rows: list[list[str]],
+               quarantine: list[QuarantinedRow] = None) -> dict[str, np.ndarray]:
+    """Returns the columns of schema converted from rows, as a dictionary mapping each
+    column name to a typed array with one value per valid row.
+
+    rows must not include the header. If any row can not be converted, it is left out of
+    every column and a QuarantinedRow describing it is appended to quarantine, if given.
+
+    >>> columns = parse_rows(UNEMPLOYMENT_SCHEMA, [['2020-03-01', '7.8'], ['2020-04-01', '']])
+    >>> columns['rate'].tolist()
+    [7.8]
+    >>> quarantine = []
+    >>> columns = parse_rows(UNEMPLOYMENT_SCHEMA, [['2020-03-01', '7.8'], ['', '8.0']],
+    ...                      quarantine)
+    >>> columns['month'].tolist(), len(quarantine)
+    ([datetime.date(2020, 3, 1)], 1)
+    """
+    try:
+        return {name: convert_column([row[column.position] for row in rows], column.dtype)
+                for name, column in schema.columns.items()}
+    except (ValueError, OverflowError, IndexError):
+        invalid = invalid_rows(schema, rows)
+
+    if quarantine is not None:
+        quarantine.extend(QuarantinedRow(schema.dataset, i + 2, invalid[i]) for i in invalid)
+
+    valid_rows = [rows[i] for i in range(len(rows)) if i not in invalid]
+    return {name: convert_column([row[column.position] for row in valid_rows], column.dtype)
+            for name, column in schema.columns.items()}
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['dataclasses', 'typing', 'numpy'],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import doctest
+
+    doctest.testmod()
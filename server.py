@@ -0,0 +1,224 @@
+"""Evaluating the impact of COVID-19 on Canadians’ spending habits: server module
+
+This module is responsible for serving the loaded data and graphs as json over a local
+http server, so that several users can share a single loaded copy of the datasets.
+
+Copyright and Usage Information
+===============================
+This file is Copyright (c) 2021 Ajinkya Bhosale.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import graph
+from categories import CategoryMapping
+from export import ExportJob, build_figure, pool_context
+
+# The attributes of graph.main_data that can be returned as json
+DATA_COLUMNS = ['covid_cases', 'unemployment_rate', 'cpi', 'csi']
+
+# The process pool used for building figures, created by serve()
+_POOL = None
+
+
+def parse_date(text: str) -> date:
+    """Returns the date represented by text in the format YYYY-MM-DD.
+
+    >>> parse_date('2020-03-01')
+    datetime.date(2020, 3, 1)
+    """
+    year, month, day = text.split('-')
+    return date(int(year), int(month), int(day))
+
+
+def to_builtin(value: object) -> object:
+    """Returns the builtin python equivalent of a numpy scalar or category mapping, for use
+    with json.dumps.
+    """
+    if isinstance(value, CategoryMapping):
+        return dict(value)
+    return value.item()
+
+
+def start_worker() -> int:
+    """Returns the process id of the worker running it. This is submitted to every worker
+    of the pool by serve(), so that they are all started before any request is handled.
+    """
+    return os.getpid()
+
+
+def figure_json(job: ExportJob) -> str:
+    """Returns the json representation of the figure described by job.
+
+    This runs inside the worker processes of the pool.
+    """
+    return build_figure(job).to_json()
+
+
+@lru_cache(maxsize=256)
+def data_response(start_date: date, end_date: date) -> bytes:
+    """Returns the json body of the /data endpoint for the given date range.
+    """
+    filtered_data = graph.get_filtered_data(start_date, end_date)
+    records = [{'date': str(row.date), **{column: getattr(row, column)
+                                          for column in DATA_COLUMNS}}
+               for row in filtered_data.itertuples()]
+    return json.dumps(records, default=to_builtin).encode('utf-8')
+
+
+@lru_cache(maxsize=256)
+def normalize_response(start_date: date, end_date: date, categories: tuple) -> bytes:
+    """Returns the json body of the /normalize endpoint for the given date range and
+    categories.
+
+    Preconditions:
+        - graph.unknown_choices(graph.main_data, list(categories)) == []
+    """
+    filtered_data = graph.get_filtered_data(start_date, end_date)
+    values = graph.normalize_data(filtered_data, list(categories))
+    return json.dumps(dict(zip(categories, values)), default=to_builtin).encode('utf-8')
+
+
+@lru_cache(maxsize=256)
+def figure_response(chart: str, start_date: date, end_date: date, categories: tuple) -> bytes:
+    """Returns the json body of the /figure endpoint for the given chart type, date range
+    and categories.
+
+    The figure is built on the process pool when the server is running, and in the
+    calling thread otherwise.
+    """
+    job = ExportJob(chart, start_date, end_date, list(categories), chart)
+    if _POOL is None:
+        return figure_json(job).encode('utf-8')
+    return _POOL.submit(figure_json, job).result().encode('utf-8')
+
+
+def etag(body: bytes) -> str:
+    """Returns the entity tag of a response body.
+    """
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    """The request handler for the dashboard server.
+
+    Every response body is cached by its query, so repeated requests for the same range
+    are served from memory, and requests whose If-None-Match header matches the entity
+    tag of the body are answered with 304 Not Modified.
+    """
+
+    def do_GET(self) -> None:
+        """Handles a GET request to one of the json endpoints.
+        """
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        try:
+            body = self.route(url.path, query)
+        except (KeyError, ValueError, IndexError) as error:
+            self.send_json(400, json.dumps({'error': str(error)}).encode('utf-8'))
+            return
+        except Exception as error:  # pylint: disable=broad-except
+            self.log_error('%s while handling %s: %s', type(error).__name__, self.path,
+                           error)
+            self.send_json(500, json.dumps({'error': 'Internal server error'}).encode('utf-8'))
+            return
+
+        if body is None:
+            self.send_json(404, json.dumps({'error': 'Not found'}).encode('utf-8'))
+            return
+
+        tag = etag(body)
+        if self.headers.get('If-None-Match') == tag:
+            self.send_response(304)
+            self.send_header('ETag', tag)
+            self.end_headers()
+        else:
+            self.send_json(200, body, tag)
+
+    def route(self, path: str, query: dict) -> bytes:
+        """Returns the body of the endpoint at path, or None if there is no such endpoint.
+        """
+        start_date = parse_date(query['start'][0])
+        end_date = parse_date(query['end'][0])
+        categories = tuple(query['categories'][0].split(',')) if 'categories' in query else ()
+        unknown = graph.unknown_choices(graph.main_data, list(categories))
+        if unknown:
+            raise ValueError('Unknown categories: ' + ', '.join(unknown))
+
+        if path == '/data':
+            return data_response(start_date, end_date)
+        elif path == '/normalize':
+            return normalize_response(start_date, end_date, categories)
+        elif path.startswith('/figure/') and path[len('/figure/'):] in {'line', 'animated',
+                                                                          'bar'}:
+            return figure_response(path[len('/figure/'):], start_date, end_date, categories)
+        else:
+            return None
+
+    def send_json(self, status: int, body: bytes, tag: str = None) -> None:
+        """Sends body as a json response with the given status code.
+        """
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if tag is not None:
+            self.send_header('ETag', tag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port: int = 8050, max_workers: int = None) -> None:
+    """Runs the dashboard server on localhost until interrupted.
+
+    Requests are handled concurrently on separate threads, while figures are built on a
+    pool of worker processes, which are all started from export.pool_context() before the
+    first request is accepted. The server only binds to localhost, so it can be used
+    without a network connection.
+
+    Sample usage:
+    # NOTE: commented instead of written as a doctest as otherwise doctest.testmod()
+     will block while serving
+    # serve(8050)
+    # Then request e.g. http://localhost:8050/figure/line?start=2020-03-01&end=2021-02-01
+    #                   &categories=covid_cases,csi
+    """
+    global _POOL
+    workers = max_workers or os.cpu_count() or 1
+    _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+    # start every worker now, from the main thread, instead of from the request threads
+    for future in [_POOL.submit(start_worker) for _ in range(workers)]:
+        future.result()
+    server = ThreadingHTTPServer(('127.0.0.1', port), DashboardHandler)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        _POOL.shutdown()
+        _POOL = None
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'extra-imports': ['hashlib', 'json', 'os', 'concurrent.futures', 'datetime', 'functools',
+                          'http.server', 'urllib.parse', 'graph', 'categories', 'export'],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200', 'C0103']
+    })
+
+    import doctest
+
+    doctest.testmod()
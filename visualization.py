@@ -76,6 +76,13 @@ PICTURE = pygame.transform.scale(PICTURE, (331, 251))
 ABOUT = pygame.image.load('about_info.png').convert()
 ABOUT = pygame.transform.scale(ABOUT, (551, 250))
 
+# The date range of the graphs, set by set_date_range
+START_DATE = date(2020, 3, 1)
+END_DATE = date(2021, 10, 1)
+
+# Whether dispatch_graph opens the graphs it builds in the browser
+SHOW_GRAPHS = True
+
 # The theme_color list stores all the colors for each theme
 THEME_COLOR = [[TEAL, GRASS], [MID_RED, WHITE], [LIGHT_RED, RED],
                [PURPLE, LIGHT_PURPLE], [BLUE, LIGHT_BLUE], [DARK_PEACH, LIGHT_PEACH]]
@@ -167,28 +174,47 @@ def mouse_click(pos: tuple[int, int], page: int, option_gui: bool, theme_number:
             category_changer('unemployment_rate', category_list)
 
         elif 47 <= pos[0] <= 211 and 385 <= pos[1] <= 429:  # bar graph code
-            start_dt = START_DATE
-            end_dt = END_DATE
-            filtered_data = graph.get_filtered_data(start_dt, end_dt)
-            graph.csi_bar_chart(filtered_data)
+            dispatch_graph('bar', category_list)
 
         elif 250 <= pos[0] <= 400 and 390 <= pos[1] <= 460 and category_list != []:
             # submit_clicked = 1
-            start_dt = START_DATE
-            end_dt = END_DATE
-            filtered_data = graph.get_filtered_data(start_dt, end_dt)
-            graph.line_graph(filtered_data, category_list)
+            dispatch_graph('line', category_list)
 
         elif 430 <= pos[0] <= 580 and 390 <= pos[1] <= 460 and category_list != []:
             # animate_clicked = 1
-            start_dt = START_DATE
-            end_dt = END_DATE
-            filtered_data = graph.get_filtered_data(start_dt, end_dt)
-            graph.animated_graph(filtered_data, category_list)
+            dispatch_graph('animated', category_list)
 
     return (position, page_num, option, theme, category_list)
 
 
+def dispatch_graph(chart: str, category_list: list) -> None:
+    """
+    This function builds the graph of the given type for the selected date range and
+    categories, and displays it unless SHOW_GRAPHS is False.
+    """
+    filtered_data = graph.get_filtered_data(START_DATE, END_DATE)
+
+    if chart == 'bar':
+        fig = graph.csi_bar_figure(filtered_data)
+    elif chart == 'line':
+        fig = graph.line_figure(filtered_data, category_list)
+    else:
+        fig = graph.animated_figure(filtered_data, category_list)
+
+    if SHOW_GRAPHS:
+        fig.show()
+
+
+def set_date_range(start_date: date, end_date: date) -> None:
+    """
+    This function sets the date range used by the graphs.
+    """
+    global START_DATE
+    global END_DATE
+    START_DATE = start_date
+    END_DATE = end_date
+
+
 def category_changer(category: str, category_list: list) -> list:
     """
     Returns the updated category list based on the existing
@@ -293,6 +319,33 @@ def page_three_buttons(categories: list, theme_number: int) -> None:
         counter += 80
 
 
+def format_date(dt: date) -> str:
+    """
+    Returns the date in the YYYY, MM, DD format the user inputs dates in.
+    """
+    return str(dt.year) + ', ' + str(dt.month) + ', ' + str(dt.day)
+
+
+def read_date_range() -> tuple[date, date]:
+    """
+    Returns the start and end date input by the user, asking again until they are
+    within the range of data that can be graphed.
+    """
+    minimum, maximum = graph.available_range()
+    while True:
+        s_date = input('Please input the start date of the graph YYYY, MM, DD '
+                       '(minimum: ' + format_date(minimum) + '): ').split(', ')
+        e_date = input('Please input the end date of the graph YYYY, MM, DD '
+                       '(maximum: ' + format_date(maximum) + '): ').split(', ')
+        start_date = date(int(s_date[0]), int(s_date[1]), int(s_date[2]))
+        end_date = date(int(e_date[0]), int(e_date[1]), int(e_date[2]))
+
+        if minimum <= start_date <= end_date <= maximum:
+            return (start_date, end_date)
+        print('Please choose dates between the minimum and maximum, with the start date '
+              'before the end date.')
+
+
 def show_visual() -> None:
     """
     This is the main function that shows the visualization. The function does not
@@ -301,17 +354,10 @@ def show_visual() -> None:
     Sample usage:
     Simply calling this function will output the visualization.
     """
-    global START_DATE
-    global END_DATE
     page, theme_number = 0, 0
     done, option_gui = False, False
     categories = []
-    s_date = input('Please input the start date of the graph YYYY, MM, DD '
-                   '(minimum: 2020, 3, 1): ').split(', ')
-    START_DATE = date(int(s_date[0]), int(s_date[1]), int(s_date[2]))
-    e_date = input('Please input the end date of the graph YYYY, MM, DD '
-                   '(maximum: 2021, 10, 1): ').split(', ')
-    END_DATE = date(int(e_date[0]), int(e_date[1]), int(e_date[2]))
+    set_date_range(*read_date_range())
     while not done:
         # This will get the mouse position
         pos = pygame.mouse.get_pos()
@@ -324,59 +370,67 @@ def show_visual() -> None:
                 pos, page, option_gui, theme_number, categories = \
                     mouse_click(pos, page, option_gui, theme_number, categories)
 
-        if page == 0:
-            # This fills the SCREEN with a specific color
-            SCREEN.fill(DARK_GREY)
-
-            # This creates the graph and about button
-            page_one_buttons(pos, theme_number)
-            SCREEN.blit(GRAPH1, [240, 137])
-            SCREEN.blit(ABOUT1, [240, 287])
-
-            # This will create the options tab
-            draw_option_gui(option_gui, theme_number)
-            if 25 <= pos[0] <= 53 and 34 <= pos[1] <= 62:
-                pygame.draw.rect(SCREEN, THEME_COLOR[theme_number][1], [25, 34, 28, 28], 2)
-            else:
-                pygame.draw.rect(SCREEN, THEME_COLOR[theme_number][0], [25, 34, 28, 28], 2)
-            SCREEN.blit(OPTION1, [30, 30])
-
-        elif page == 1:
-            # This fills the SCREEN with a specific color
-            SCREEN.fill(DARK_GREY)
-
-            # The following draws the border and the back button
-            pygame.draw.rect(SCREEN, THEME_COLOR[theme_number][0], [20, 20, 560, 460], 1)
-            pygame.draw.rect(SCREEN, THEME_COLOR[theme_number][1], [22, 22, 556, 456], 3)
-            SCREEN.blit(TEXT1, [35, 55])
-            SCREEN.blit(ABOUT, [25, 100])
-            SCREEN.blit(BACK2, [38, 437])
-
-        elif page == 2:
-            # This fills the SCREEN with a specific color
-            SCREEN.fill(DARK_GREY)
-            pygame.draw.rect(SCREEN, THEME_COLOR[theme_number][0], [29, 32, 202, 436], 3)
-            pygame.draw.rect(SCREEN, THEME_COLOR[theme_number][0], [245, 35, 335, 255], 3)
-            SCREEN.blit(PICTURE, [247, 37])
-
-            # The following creates the submit and animate button
-            draw_submit_animate(pos, theme_number)
-            SCREEN.blit(SUBMIT, [287, 412])
-            SCREEN.blit(ANIMATE, [461, 412])
-
-            # The follow creates all the buttons
-            page_three_buttons(categories, theme_number)
-            SCREEN.blit(GRAPH_BTN1, [58, 72])
-            SCREEN.blit(GRAPH_BTN2, [105, 152])
-            SCREEN.blit(GRAPH_BTN3, [105, 232])
-            SCREEN.blit(GRAPH_BTN4, [60, 319])
-            SCREEN.blit(GRAPH_BTN5, [90, 392])
+        draw_page(pos, page, option_gui, theme_number, categories)
 
         pygame.display.flip()
         CLOCK.tick(60)
     pygame.display.quit()
 
 
+def draw_page(pos: tuple[int, int], page: int, option_gui: bool, theme_number: int,
+              categories: list) -> None:
+    """
+    This function draws the current page onto the SCREEN for the given mouse position.
+    """
+    if page == 0:
+        # This fills the SCREEN with a specific color
+        SCREEN.fill(DARK_GREY)
+
+        # This creates the graph and about button
+        page_one_buttons(pos, theme_number)
+        SCREEN.blit(GRAPH1, [240, 137])
+        SCREEN.blit(ABOUT1, [240, 287])
+
+        # This will create the options tab
+        draw_option_gui(option_gui, theme_number)
+        if 25 <= pos[0] <= 53 and 34 <= pos[1] <= 62:
+            pygame.draw.rect(SCREEN, THEME_COLOR[theme_number][1], [25, 34, 28, 28], 2)
+        else:
+            pygame.draw.rect(SCREEN, THEME_COLOR[theme_number][0], [25, 34, 28, 28], 2)
+        SCREEN.blit(OPTION1, [30, 30])
+
+    elif page == 1:
+        # This fills the SCREEN with a specific color
+        SCREEN.fill(DARK_GREY)
+
+        # The following draws the border and the back button
+        pygame.draw.rect(SCREEN, THEME_COLOR[theme_number][0], [20, 20, 560, 460], 1)
+        pygame.draw.rect(SCREEN, THEME_COLOR[theme_number][1], [22, 22, 556, 456], 3)
+        SCREEN.blit(TEXT1, [35, 55])
+        SCREEN.blit(ABOUT, [25, 100])
+        SCREEN.blit(BACK2, [38, 437])
+
+    elif page == 2:
+        # This fills the SCREEN with a specific color
+        SCREEN.fill(DARK_GREY)
+        pygame.draw.rect(SCREEN, THEME_COLOR[theme_number][0], [29, 32, 202, 436], 3)
+        pygame.draw.rect(SCREEN, THEME_COLOR[theme_number][0], [245, 35, 335, 255], 3)
+        SCREEN.blit(PICTURE, [247, 37])
+
+        # The following creates the submit and animate button
+        draw_submit_animate(pos, theme_number)
+        SCREEN.blit(SUBMIT, [287, 412])
+        SCREEN.blit(ANIMATE, [461, 412])
+
+        # The follow creates all the buttons
+        page_three_buttons(categories, theme_number)
+        SCREEN.blit(GRAPH_BTN1, [58, 72])
+        SCREEN.blit(GRAPH_BTN2, [105, 152])
+        SCREEN.blit(GRAPH_BTN3, [105, 232])
+        SCREEN.blit(GRAPH_BTN4, [60, 319])
+        SCREEN.blit(GRAPH_BTN5, [90, 392])
+
+
 if __name__ == '__main__':
     import python_ta
 
@@ -384,7 +438,7 @@ if __name__ == '__main__':
         'max-line-length': 100,
         'extra-imports': ['pygame', 'datetime', 'graph'],
         'generated-members': ['pygame.*'],
-        'allowed-io': ['show_visual']
+        'allowed-io': ['show_visual', 'read_date_range']
     })
 
     import python_ta.contracts